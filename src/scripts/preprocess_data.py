@@ -1,8 +1,44 @@
+import hashlib
+import inspect
+import json
+import numpy as np
 import pandas as pd
 
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 from jsonargparse import CLI
 from pathlib import Path
 
+# Columns needed from the IMDb dumps and their dtypes. Read as strings to keep IMDb's `\N` values
+IMDB_TITLE_BASICS_DTYPES = {
+    "tconst": str,
+    "titleType": "category",
+    "primaryTitle": str,
+    "startYear": str,
+    "genres": str,
+}
+IMDB_NAME_BASICS_DTYPES = {
+    "nconst": str,
+    "primaryName": str,
+    "birthYear": str,
+    "knownForTitles": str,
+}
+
+# Year columns stored as nullable integers in Parquet outputs
+PARQUET_YEAR_COLUMNS = ["release_year", "movie_release_year", "director_birth_year"]
+
+# MovieLens ratings are given in half-star steps from 0.5 to 5 stars
+MOVIE_LENS_RATING_VALUES = np.arange(0.5, 5.5, 0.5)
+
+# IMDb identifier columns, stored as integer codes and formatted back with their prefix in CSV
+# outputs, e.g. 111161 <-> "tt0111161"
+IMDB_ID_COLUMNS = {
+    "imdb_id": "tt",
+    "movie_id": "tt",
+    "director_id": "nm",
+    "actor_id": "nm",
+}
+
 
 def preprocess_data(
     cmu_movie_metadata_path: Path = "../../data/cmu/movie.metadata.tsv",
@@ -18,6 +54,14 @@ def preprocess_data(
     movie_lens_ratings_path: Path = "../../data/movielens/rating.csv",
     movie_lens_links_path: Path = "../../data/movielens/link.csv",
     output_dir: Path = "../../data",
+    output_format: str = "csv",
+    imdb_chunksize: int = 1_000_000,
+    movie_lens_chunksize: int = 1_000_000,
+    keep_user_ratings: bool = False,
+    title_year_tolerance: int = 0,
+    cache_dir: Path = "../../data/.cache",
+    use_cache: bool = True,
+    max_workers: int = 1,
 ):
     """
     Preprocess data for decoding box-office bombs using CMU, IMDb, tropes and TMDb datasets
@@ -36,56 +80,129 @@ def preprocess_data(
         movie_lens_ratings_path (Path): path to the MovieLens ratings dataset
         movie_lens_links_path (Path): path to the MovieLens links dataset
         output_dir (Path): path to save the preprocessed data
+        output_format (str): format of the preprocessed files, either "csv" or "parquet"
+        imdb_chunksize (int): number of rows read at a time from the large IMDb dumps
+        movie_lens_chunksize (int): number of rows read at a time from the MovieLens ratings
+        keep_user_ratings (bool): whether to keep one row per MovieLens rating instead of
+            aggregating the ratings of each movie
+        title_year_tolerance (int): maximum number of years between the release years of CMU movies
+            and the TMDb or IMDb movies matched to them by title
+        cache_dir (Path): path to cache the output of each preprocessing stage
+        use_cache (bool): whether to skip stages whose inputs, parameters and code did not change
+        max_workers (int): number of worker processes running independent stages concurrently
     """
-
-    print("Preprocessing df_cmu_movie_metadata...")
-    df_cmu_movie_metadata = preprocess_cmu_movie_metadata(cmu_movie_metadata_path)
-
-    print("Preprocessing df_tmdb...")
-    df_tmdb = preprocess_tmdb_data(tmdb_path)
-
-    print("Preprocessing df_cmu_character_metadata...")
-    df_cmu_character_metadata = preprocess_character_metadata(
-        cmu_character_metadata_path
-    )
-
-    print("Preprocessing df_imdb_tropes...")
-    df_imdb_tropes = preprocess_tropes(tropes_path, imdb_movie_tropes_path)
-
-    print("Preprocessing movie lens ratings...")
-    df_ml_ratings = preprocess_movie_lens_ratings(
-        movie_lens_ratings_path, movie_lens_links_path
-    )
-
-    print("Preprocessing df_imdb_data...")
-    df_imdb_movie_tropes, df_imdb_directors_actors, df_imdb_complete = (
-        preprocess_imdb_data(
-            imdb_title_basics_path,
-            imdb_title_ratings_path,
-            imdb_title_crew_path,
-            imdb_name_basics_path,
-            imdb_title_principals_path,
-            df_cmu_movie_metadata,
-            df_imdb_tropes,
+    if title_year_tolerance < 0:
+        raise ValueError(
+            f"title_year_tolerance must be non-negative, got {title_year_tolerance}"
         )
-    )
-
-    save_data_csv(df_imdb_tropes, f"{output_dir}/imdb_tropes.csv")
-    save_data_csv(df_imdb_complete, f"{output_dir}/movie_directors_actors.csv")
-
-    df_cmu_tmdb = merge_cmu_movie_metadata_and_tmdb(df_cmu_movie_metadata, df_tmdb)
-    save_data_csv(df_cmu_tmdb, f"{output_dir}/cmu_tmdb.csv")
 
-    df_cmu_tropes = merge_cmu_tropes(df_cmu_tmdb, df_imdb_movie_tropes)
-    save_data_csv(df_cmu_tropes, f"{output_dir}/cmu_tropes.csv")
-
-    df_movie_actors = merge_cmu_and_imdb_directors_actors(
-        df_cmu_character_metadata, df_cmu_movie_metadata, df_imdb_directors_actors
+    stages = {
+        "cmu_movie_metadata": define_stage(
+            preprocess_cmu_movie_metadata,
+            inputs={"cmu_movie_metadata_path": cmu_movie_metadata_path},
+        ),
+        "tmdb": define_stage(preprocess_tmdb_data, inputs={"tmdb_path": tmdb_path}),
+        "cmu_character_metadata": define_stage(
+            preprocess_character_metadata,
+            inputs={"cmu_character_metadata_path": cmu_character_metadata_path},
+        ),
+        "imdb_tropes": define_stage(
+            preprocess_tropes,
+            inputs={
+                "tropes_path": tropes_path,
+                "imdb_movie_tropes_path": imdb_movie_tropes_path,
+            },
+        ),
+        "ml_ratings": define_stage(
+            preprocess_movie_lens_ratings,
+            inputs={
+                "movie_lens_ratings_path": movie_lens_ratings_path,
+                "movie_lens_links_path": movie_lens_links_path,
+            },
+            params={
+                "chunksize": movie_lens_chunksize,
+                "keep_user_ratings": keep_user_ratings,
+            },
+        ),
+        "imdb": define_stage(
+            preprocess_imdb_data,
+            inputs={
+                "imdb_title_basics_path": imdb_title_basics_path,
+                "imdb_title_ratings_path": imdb_title_ratings_path,
+                "imdb_title_crew_path": imdb_title_crew_path,
+                "imdb_name_basics_path": imdb_name_basics_path,
+                "imdb_title_principals_path": imdb_title_principals_path,
+            },
+            params={"chunksize": imdb_chunksize},
+            deps={"df_imdb_tropes": "imdb_tropes"},
+        ),
+        "cmu_imdb_links": define_stage(
+            link_cmu_movie_metadata_and_imdb,
+            params={"year_tolerance": title_year_tolerance},
+            deps={
+                "df_cmu_movie_metadata": "cmu_movie_metadata",
+                "df_imdb_movies": ("imdb", 1),
+                "df_cmu_tmdb": "cmu_tmdb",
+            },
+        ),
+        "movie_directors": define_stage(
+            join_imdb_tables,
+            deps={
+                "df_imdb_movies": ("imdb", 1),
+                "df_imdb_movie_directors": ("imdb", 2),
+                "df_cmu_movie_metadata": "cmu_movie_metadata",
+                "df_cmu_imdb_links": "cmu_imdb_links",
+            },
+        ),
+        "cmu_tmdb_links": define_stage(
+            link_cmu_movie_metadata_and_tmdb,
+            params={"year_tolerance": title_year_tolerance},
+            deps={"df_cmu_movie_metadata": "cmu_movie_metadata", "df_tmdb": "tmdb"},
+        ),
+        "cmu_tmdb": define_stage(
+            merge_cmu_movie_metadata_and_tmdb,
+            deps={
+                "df_cmu_movie_metadata": "cmu_movie_metadata",
+                "df_tmdb": "tmdb",
+                "df_cmu_tmdb_links": "cmu_tmdb_links",
+            },
+        ),
+        "cmu_tropes": define_stage(
+            merge_cmu_tropes,
+            deps={"df_cmu_tmdb": "cmu_tmdb", "df_imdb_movie_tropes": ("imdb", 0)},
+        ),
+        "movie_actors": define_stage(
+            merge_cmu_characters_and_imdb_movies,
+            deps={
+                "df_cmu_character_metadata": "cmu_character_metadata",
+                "df_cmu_movie_metadata": "cmu_movie_metadata",
+                "df_imdb_movies": ("imdb", 1),
+                "df_cmu_imdb_links": "cmu_imdb_links",
+            },
+        ),
+        "cmu_tropes_ratings": define_stage(
+            merge_cmu_ml_ratings,
+            deps={"df_cmu_tropes": "cmu_tropes", "df_ml_ratings": "ml_ratings"},
+        ),
+    }
+
+    outputs = run_stages(
+        stages, cache_dir=cache_dir if use_cache else None, max_workers=max_workers
     )
-    save_data_csv(df_movie_actors, f"{output_dir}/movie_actors.csv")
 
-    df_cmu_tropes_ratings = merge_cmu_ml_ratings(df_cmu_tropes, df_ml_ratings)
-    save_data_csv(df_cmu_tropes_ratings, f"{output_dir}/cmu_tropes_ratings.csv")
+    save_data(outputs["imdb_tropes"], output_dir, "imdb_tropes", output_format)
+    save_data(outputs["imdb"][1], output_dir, "imdb_movies", output_format)
+    save_data(outputs["imdb"][2], output_dir, "imdb_movie_directors", output_format)
+    save_data(outputs["imdb"][3], output_dir, "imdb_movie_actors", output_format)
+    save_data(outputs["cmu_imdb_links"], output_dir, "cmu_imdb_links", output_format)
+    save_data(outputs["movie_directors"], output_dir, "movie_directors", output_format)
+    save_data(outputs["cmu_tmdb_links"], output_dir, "cmu_tmdb_links", output_format)
+    save_data(outputs["cmu_tmdb"], output_dir, "cmu_tmdb", output_format)
+    save_data(outputs["cmu_tropes"], output_dir, "cmu_tropes", output_format)
+    save_data(outputs["movie_actors"], output_dir, "movie_actors", output_format)
+    save_data(
+        outputs["cmu_tropes_ratings"], output_dir, "cmu_tropes_ratings", output_format
+    )
 
     print("Preprocessing complete!")
 
@@ -93,7 +210,7 @@ def preprocess_data(
 def preprocess_cmu_movie_metadata(cmu_movie_metadata_path):
     """
     Rename columns of the CMU movie metadata, remove rows with missing release date,
-    and extract year from each release date
+    and extract year, month and typed date from each release date
 
     Args:
         cmu_movie_metadata_path (Path): path to the CMU movie metadata file
@@ -116,8 +233,8 @@ def preprocess_cmu_movie_metadata(cmu_movie_metadata_path):
 
     # Drop rows with missing release date, and extract year from the remaining release dates
     df_cmu_movie_metadata.dropna(subset=["release_date"], inplace=True)
-    df_cmu_movie_metadata["release_year"] = df_cmu_movie_metadata["release_date"].apply(
-        extract_year
+    df_cmu_movie_metadata[["release_year", "release_month", "release_datetime"]] = (
+        extract_release_date_features(df_cmu_movie_metadata["release_date"])
     )
     return df_cmu_movie_metadata
 
@@ -125,7 +242,7 @@ def preprocess_cmu_movie_metadata(cmu_movie_metadata_path):
 def preprocess_character_metadata(cmu_character_metadata_path):
     """
     Rename columns of the CMU character metadata, remove rows with missing release date,
-    and extract year from each release date
+    and extract year, month and typed date from each release date
 
     Args:
         cmu_character_metadata_path (Path): path to the CMU character metadata file
@@ -154,9 +271,9 @@ def preprocess_character_metadata(cmu_character_metadata_path):
 
     # Drop rows with missing release date, and extract year from each release date
     df_cmu_character_metadata.dropna(subset=["release_date"], inplace=True)
-    df_cmu_character_metadata["release_year"] = df_cmu_character_metadata[
-        "release_date"
-    ].apply(extract_year)
+    df_cmu_character_metadata[["release_year", "release_month", "release_datetime"]] = (
+        extract_release_date_features(df_cmu_character_metadata["release_date"])
+    )
     return df_cmu_character_metadata
 
 
@@ -201,6 +318,7 @@ def preprocess_tropes(tropes_path, imdb_movie_tropes_path):
         ]
     ]
     df_imdb_movie_tropes.rename(columns={"tconst": "imdb_id"}, inplace=True)
+    df_imdb_movie_tropes["imdb_id"] = encode_imdb_id(df_imdb_movie_tropes["imdb_id"])
     return df_imdb_movie_tropes
 
 
@@ -210,11 +328,13 @@ def preprocess_imdb_data(
     imdb_title_crew_path,
     imdb_name_basics_path,
     imdb_title_principals_path,
-    df_cmu_movie_metadata,
     df_imdb_tropes,
+    chunksize=1_000_000,
 ):
     """
-    Load IMDb datasets, merge them, and extract relevant columns for analysis
+    Load IMDb datasets and extract normalized movie, movie director and movie actor tables for
+    analysis. The large IMDb dumps are streamed in chunks, and each chunk is reduced to the movies,
+    their directors and actors, and the people involved in them before being kept in memory
 
     Args:
         imdb_title_basics_path (Path): path to the IMDb title basics dataset
@@ -222,18 +342,25 @@ def preprocess_imdb_data(
         imdb_title_crew_path (Path): path to the IMDb title crew dataset
         imdb_name_basics_path (Path): path to the IMDb name basics dataset
         imdb_title_principals_path (Path): path to the IMDb title principals dataset
-        df_cmu_movie_metadata (pd.DataFrame): CMU movie metadata
         df_imdb_tropes (pd.DataFrame): IMDb movie tropes dataset
+        chunksize (int): number of rows read at a time from the large IMDb dumps
     Returns:
         df_imdb_movie_tropes (pd.DataFrame): merged IMDb movie tropes dataset with tropes dataset
-        df_imdb_directors_actors (pd.DataFrame): IMDb directors and actors dataset
-        df_imdb_complete (pd.DataFrame): complete IMDb dataset for analyzing directors and revenue in CMU dataset
+        df_imdb_movies (pd.DataFrame): IMDb movies with ratings, one row per movie
+        df_imdb_movie_directors (pd.DataFrame): IMDb movie directors, one row per movie director
+        df_imdb_movie_actors (pd.DataFrame): IMDb movie actors, one row per movie actor
     """
-    # Load title.basics for movie details
-    df_imdb_title_basics = pd.read_csv(imdb_title_basics_path, sep="\t")
-    df_imdb_title_basics = df_imdb_title_basics[
-        df_imdb_title_basics["titleType"] == "movie"
-    ]
+    # Load title.basics for movie details, keeping only movies while reading
+    df_imdb_title_basics = read_tsv_in_chunks(
+        imdb_title_basics_path,
+        usecols=IMDB_TITLE_BASICS_DTYPES.keys(),
+        dtype=IMDB_TITLE_BASICS_DTYPES,
+        filter_column="titleType",
+        filter_value="movie",
+        chunksize=chunksize,
+    )
+    df_imdb_title_basics["tconst"] = encode_imdb_id(df_imdb_title_basics["tconst"])
+    movie_ids = df_imdb_title_basics["tconst"]
 
     # Load title.ratings for movie ratings
     df_imdb_title_ratings = pd.read_csv(
@@ -241,41 +368,67 @@ def preprocess_imdb_data(
         sep="\t",
         usecols=["tconst", "averageRating", "numVotes"],
     )
+    df_imdb_title_ratings["tconst"] = encode_imdb_id(df_imdb_title_ratings["tconst"])
+
+    # Load title.crew for director information. Each chunk is reduced to the directors of movies,
+    # with multiple directors expanded, before being kept
+    def select_movie_directors(chunk):
+        chunk = chunk[chunk["directors"] != "\\N"]
+        chunk = chunk.assign(tconst=encode_imdb_id(chunk["tconst"]))
+        chunk = chunk[chunk["tconst"].isin(movie_ids)]
+        chunk = chunk.assign(director=chunk["directors"].str.split(",")).explode(
+            "director"
+        )
+        return chunk.assign(director=encode_imdb_id(chunk["director"]))[
+            ["tconst", "director"]
+        ]
 
-    # Load title.crew for director information, remove rows with missing directors, and expand multiple directors
-    df_imdb_title_crew = pd.read_csv(
-        imdb_title_crew_path, sep="\t", usecols=["tconst", "directors"]
+    df_imdb_title_crew = read_tsv_in_chunks(
+        imdb_title_crew_path,
+        usecols=["tconst", "directors"],
+        dtype={"tconst": str, "directors": str},
+        transform=select_movie_directors,
+        chunksize=chunksize,
     )
-    df_imdb_title_crew = df_imdb_title_crew[df_imdb_title_crew["directors"] != "\\N"]
-    df_imdb_title_crew = df_imdb_title_crew.assign(
-        director=df_imdb_title_crew["directors"].str.split(",")
-    ).explode("director")
 
-    # Load name.basics for director details
-    df_imdb_name_basics = pd.read_csv(
-        imdb_name_basics_path,
-        sep="\t",
-        usecols=[
-            "nconst",
-            "primaryName",
-            "birthYear",
-            "primaryProfession",
-            "knownForTitles",
-        ],
+    # Load title.principals for actor information. We already handle director information through title.crew and name.basics.
+    # We will only load actor information here, for movies only.
+    def select_movie_actors(chunk):
+        chunk = chunk.assign(
+            tconst=encode_imdb_id(chunk["tconst"]), nconst=encode_imdb_id(chunk["nconst"])
+        )
+        return chunk[chunk["tconst"].isin(movie_ids)]
+
+    df_imdb_title_principals = read_tsv_in_chunks(
+        imdb_title_principals_path,
+        usecols=["tconst", "nconst", "category"],
+        dtype={"tconst": str, "nconst": str, "category": "category"},
+        filter_column="category",
+        filter_value="actor",
+        transform=select_movie_actors,
+        chunksize=chunksize,
     )
 
-    # Load title.principals for actor information. We already handle director information through title.crew and name.basics.
-    # We will only load actor information here.
-    df_imdb_title_principals = pd.read_csv(
-        imdb_title_principals_path, sep="\t", usecols=["tconst", "nconst", "category"]
+    # Load name.basics for director and actor details, keeping only the people of the movies
+    person_ids = pd.concat(
+        [df_imdb_title_crew["director"], df_imdb_title_principals["nconst"]]
+    ).unique()
+
+    def select_movie_people(chunk):
+        chunk = chunk.assign(nconst=encode_imdb_id(chunk["nconst"]))
+        return chunk[chunk["nconst"].isin(person_ids)]
+
+    df_imdb_name_basics = read_tsv_in_chunks(
+        imdb_name_basics_path,
+        usecols=IMDB_NAME_BASICS_DTYPES.keys(),
+        dtype=IMDB_NAME_BASICS_DTYPES,
+        transform=select_movie_people,
+        chunksize=chunksize,
     )
-    df_imdb_title_principals = df_imdb_title_principals[
-        df_imdb_title_principals["category"] == "actor"
-    ]
 
     # -----------------------------------------------------------------------------------------------
-    # Obtain complete IMDb dataset for analyzing directors and revenue in CMU dataset, and merging
-    # tropes dataset with IMDb dataset
+    # Obtain normalized IMDb tables with one row per movie, per movie director and per movie actor,
+    # and merge tropes dataset with IMDb dataset. Use `join_imdb_tables` to combine them on demand
 
     # Merge IMDb titles.basics information with tropes for tropes analysis
     df_imdb_movie_tropes = pd.merge(
@@ -290,86 +443,141 @@ def preprocess_imdb_data(
     df_imdb_movies = pd.merge(
         df_imdb_title_basics, df_imdb_title_ratings, on="tconst", how="left"
     )
-
-    # Merge with title.crew to add director information
-    df_imdb_directors = pd.merge(
-        df_imdb_movies, df_imdb_title_crew, on="tconst", how="left"
-    )
-
-    # Merge with name.basics to get director's name and known titles
-    df_imdb_directors = pd.merge(
-        df_imdb_directors,
-        df_imdb_name_basics,
-        left_on="director",
-        right_on="nconst",
-        how="left",
-    )
-
-    # Merge with title.principals to add actor information
-    df_imdb_directors_actors = pd.merge(
-        df_imdb_directors, df_imdb_title_principals, on="tconst", how="left"
-    )
-
-    # Now, merge again with name.basics to get the actor's name (for the `actor_id` from `title.principals`)
-    df_imdb_directors_actors = pd.merge(
-        df_imdb_directors_actors,
-        df_imdb_name_basics[["nconst", "primaryName"]],
-        left_on="nconst_y",
-        right_on="nconst",
-        how="left",
-    )
-
-    # Keep only relevant columns in the final merged DataFrame
-    df_imdb_directors_actors = df_imdb_directors_actors[
-        [
-            "tconst",
-            "primaryTitle",
-            "startYear",
-            "genres",
-            "averageRating",
-            "numVotes",
-            "primaryName_x",
-            "birthYear",
-            "knownForTitles",
-            "nconst_y",
-            "primaryName_y",
-        ]
+    df_imdb_movies = df_imdb_movies[
+        ["tconst", "primaryTitle", "startYear", "genres", "averageRating", "numVotes"]
     ]
-
-    df_imdb_directors_actors.columns = [
+    df_imdb_movies.columns = [
         "movie_id",
         "movie_name",
         "movie_release_year",
         "genres",
         "average_rating",
         "num_votes",
+    ]
+    df_imdb_movies["movie_release_year"] = pd.to_numeric(
+        df_imdb_movies["movie_release_year"], errors="coerce"
+    ).astype("Int16")
+    check_unique_ids(df_imdb_movies, "movie_id", "IMDb movies")
+
+    # Merge movie directors from title.crew with name.basics to get director's name and known titles
+    df_imdb_movie_directors = pd.merge(
+        df_imdb_title_crew,
+        df_imdb_name_basics,
+        left_on="director",
+        right_on="nconst",
+        how="left",
+    )
+    df_imdb_movie_directors = df_imdb_movie_directors[
+        ["tconst", "director", "primaryName", "birthYear", "knownForTitles"]
+    ]
+    df_imdb_movie_directors.columns = [
+        "movie_id",
+        "director_id",
         "director_name",
         "director_birth_year",
         "director_known_titles",
-        "actor_id",
-        "actor_name",
     ]
 
-    # Merge IMDb data with CMU data to include revenue
-    df_cmu_movie_revenue = df_cmu_movie_metadata[["name", "revenue"]]
-    df_imdb_complete = pd.merge(
-        df_imdb_directors_actors,
-        df_cmu_movie_metadata,
-        left_on="movie_name",  # IMDb movie name
-        right_on="name",  # CMU movie name
+    # Merge movie actors from title.principals with name.basics to get the actor's name
+    df_imdb_movie_actors = pd.merge(
+        df_imdb_title_principals,
+        df_imdb_name_basics[["nconst", "primaryName"]],
+        on="nconst",
         how="left",
     )
+    df_imdb_movie_actors = df_imdb_movie_actors[["tconst", "nconst", "primaryName"]]
+    df_imdb_movie_actors.columns = ["movie_id", "actor_id", "actor_name"]
+
+    return (
+        df_imdb_movie_tropes,
+        df_imdb_movies,
+        df_imdb_movie_directors,
+        df_imdb_movie_actors,
+    )
+
+
+def join_imdb_tables(
+    df_imdb_movies,
+    df_imdb_movie_directors=None,
+    df_imdb_movie_actors=None,
+    df_cmu_movie_metadata=None,
+    df_cmu_imdb_links=None,
+):
+    """
+    Join the normalized IMDb tables on demand. Only the requested tables are joined, so for
+    example joining the directors alone gives one row per movie director instead of one row per
+    director and actor pair
+
+    Args:
+        df_imdb_movies (pd.DataFrame): IMDb movies, one row per movie
+        df_imdb_movie_directors (pd.DataFrame): IMDb movie directors, one row per movie director
+        df_imdb_movie_actors (pd.DataFrame): IMDb movie actors, one row per movie actor
+        df_cmu_movie_metadata (pd.DataFrame): CMU movie metadata, joined through
+            `df_cmu_imdb_links` to include revenue
+        df_cmu_imdb_links (pd.DataFrame): CMU to IMDb link table from
+            `link_cmu_movie_metadata_and_imdb`, required to join the CMU movie metadata
+    Returns:
+        df_imdb_joined (pd.DataFrame): joined IMDb dataset
+    """
+    check_unique_ids(df_imdb_movies, "movie_id", "IMDb movies")
+
+    df_imdb_joined = df_imdb_movies
+    if df_imdb_movie_directors is not None:
+        df_imdb_joined = pd.merge(
+            df_imdb_joined, df_imdb_movie_directors, on="movie_id", how="left"
+        )
+    if df_imdb_movie_actors is not None:
+        df_imdb_joined = pd.merge(
+            df_imdb_joined, df_imdb_movie_actors, on="movie_id", how="left"
+        )
+
+    if df_cmu_movie_metadata is not None:
+        if df_cmu_imdb_links is None:
+            raise ValueError("df_cmu_imdb_links is required to join the CMU movie metadata")
+
+        # Each IMDb movie is linked to at most one CMU movie, so the join adds no rows
+        df_imdb_joined = pd.merge(
+            df_imdb_joined,
+            df_cmu_imdb_links[["movie_id", "wikipedia_movie_id"]],
+            on="movie_id",
+            how="left",
+            validate="many_to_one",
+        )
+        df_imdb_joined = pd.merge(
+            df_imdb_joined,
+            df_cmu_movie_metadata,
+            on="wikipedia_movie_id",
+            how="left",
+            validate="many_to_one",
+        )
 
-    # Drop redundant `name` column from CMU meta data after merge
-    df_imdb_complete = df_imdb_complete.drop(columns=["name"])
+        # Drop redundant `name` column from CMU meta data after merge
+        df_imdb_joined = df_imdb_joined.drop(columns=["name"])
 
-    return df_imdb_movie_tropes, df_imdb_directors_actors, df_imdb_complete
+    return df_imdb_joined
+
+
+def check_unique_ids(df, id_column, table_name):
+    """
+    Check that a normalized table has one row per identifier, so that joins on it cannot
+    multiply rows
+
+    Args:
+        df (pd.DataFrame): table to check
+        id_column (str): identifier column
+        table_name (str): name of the table in the error message
+    """
+    num_duplicates = df[id_column].duplicated().sum()
+    if num_duplicates:
+        raise ValueError(
+            f"{table_name} must have one row per {id_column}, found {num_duplicates} duplicates"
+        )
 
 
 def preprocess_tmdb_data(tmdb_path):
     """
     Load TMDb dataset, filter released movies, drop movies with missing release date, and extract
-    year from each release date
+    year, month and typed date from each release date
 
     Args:
         tmdb_path (Path): path to the TMDb dataset
@@ -378,39 +586,174 @@ def preprocess_tmdb_data(tmdb_path):
     """
 
     df_tmdb = pd.read_csv(tmdb_path)
-    df_tmdb["release_year"] = df_tmdb["release_date"].apply(extract_year)
 
     # Clean tmdb dataset before merging it with the cmu dataset. First, filter released movies
     df_tmdb = df_tmdb[df_tmdb["status"] == "Released"]
 
     # Drop movies with missing release date
-    df_tmdb.dropna(subset=["release_date"], inplace=True)
+    df_tmdb = df_tmdb.dropna(subset=["release_date"])
 
+    df_tmdb[["release_year", "release_month", "release_datetime"]] = (
+        extract_release_date_features(df_tmdb["release_date"])
+    )
+    df_tmdb["imdb_id"] = encode_imdb_id(df_tmdb["imdb_id"])
     return df_tmdb
 
 
-def preprocess_movie_lens_ratings(movie_lens_ratings_path, movie_lens_links_path):
+def preprocess_movie_lens_ratings(
+    movie_lens_ratings_path,
+    movie_lens_links_path,
+    chunksize=1_000_000,
+    keep_user_ratings=False,
+):
     """
-    Load MovieLens ratings and links datasets, merge them, and extract relevant columns for analysis
+    Load MovieLens ratings and links datasets and merge them. By default, the ratings are streamed
+    in chunks and reduced to per-movie statistics, so that memory is bounded by the number of
+    movies rather than the number of ratings
 
     Args:
         movie_lens_ratings_path (Path): path to the MovieLens ratings dataset
         movie_lens_links_path (Path): path to the MovieLens links dataset
+        chunksize (int): number of ratings read at a time
+        keep_user_ratings (bool): whether to keep one row per rating instead of per-movie statistics
     Returns:
         df_ml_ratings (pd.DataFrame): merged MovieLens ratings and links dataset
     """
-
-    df_ml_ratings = pd.read_csv(movie_lens_ratings_path)
     df_ml_links = pd.read_csv(movie_lens_links_path)
 
+    # MovieLens already stores the numeric part of the IMDb id, which is our integer code
+    df_ml_links["imdbId"] = df_ml_links["imdbId"].astype("Int32")
+
+    if keep_user_ratings:
+        df_ml_ratings = pd.read_csv(movie_lens_ratings_path)
+    else:
+        df_ml_ratings = aggregate_movie_lens_ratings(movie_lens_ratings_path, chunksize)
+
     df_ml_ratings = pd.merge(df_ml_ratings, df_ml_links, on="movieId")
-    df_ml_ratings["imdbId"] = "tt" + df_ml_ratings["imdbId"].astype(str)
     return df_ml_ratings
 
 
+def aggregate_movie_lens_ratings(movie_lens_ratings_path, chunksize=1_000_000):
+    """
+    Stream MovieLens ratings and reduce them to per-movie sufficient statistics: number of
+    ratings, sum and sum of squares of the ratings, and the number of ratings of each half-star
+    value. Mean and standard deviation are derived from the sums
+
+    Args:
+        movie_lens_ratings_path (Path): path to the MovieLens ratings dataset
+        chunksize (int): number of ratings read at a time
+    Returns:
+        df_ml_ratings (pd.DataFrame): per-movie rating statistics
+    """
+    histogram_columns = [f"num_ratings_{value:g}" for value in MOVIE_LENS_RATING_VALUES]
+
+    df_ml_ratings = None
+    for chunk in pd.read_csv(
+        movie_lens_ratings_path,
+        usecols=["movieId", "rating"],
+        dtype={"movieId": "int32", "rating": "float64"},
+        chunksize=chunksize,
+    ):
+        # Index of the half-star value of each rating in the histogram
+        rating_bins = (np.rint(chunk["rating"] * 2) - 1).clip(0, 9).astype("int8")
+        df_histogram = pd.crosstab(chunk["movieId"], rating_bins).reindex(
+            columns=range(len(histogram_columns)), fill_value=0
+        )
+        df_histogram.columns = histogram_columns
+
+        df_chunk = chunk.assign(rating_sq=chunk["rating"] ** 2).groupby("movieId").agg(
+            num_ratings=("rating", "size"),
+            rating_sum=("rating", "sum"),
+            rating_sum_sq=("rating_sq", "sum"),
+        )
+        df_chunk = df_chunk.join(df_histogram)
+
+        if df_ml_ratings is None:
+            df_ml_ratings = df_chunk
+        else:
+            df_ml_ratings = df_ml_ratings.add(df_chunk, fill_value=0)
+
+    count_columns = ["num_ratings"] + histogram_columns
+    df_ml_ratings[count_columns] = df_ml_ratings[count_columns].astype("int64")
+
+    num_ratings = df_ml_ratings["num_ratings"]
+    df_ml_ratings["rating_mean"] = df_ml_ratings["rating_sum"] / num_ratings
+    df_ml_ratings["rating_std"] = np.sqrt(
+        (
+            (df_ml_ratings["rating_sum_sq"] - df_ml_ratings["rating_sum"] ** 2 / num_ratings)
+            / (num_ratings - 1)
+        ).clip(lower=0)
+    )
+    return df_ml_ratings.reset_index()
+
+
+def read_tsv_in_chunks(
+    path,
+    usecols,
+    dtype,
+    filter_column=None,
+    filter_value=None,
+    transform=None,
+    chunksize=1_000_000,
+):
+    """
+    Read a large tab-separated file in bounded chunks, keeping only the requested columns and,
+    optionally, only the rows where `filter_column` equals `filter_value`. Each chunk can be further
+    reduced by `transform` before being kept, so peak memory is bounded by one chunk plus the
+    reduced rows that are kept.
+
+    Args:
+        path (Path): path to the tab-separated file
+        usecols (list): columns to read
+        dtype (dict): dtype of each column read
+        filter_column (str): column used to filter rows while reading
+        filter_value: value that `filter_column` must have for a row to be kept
+        transform (callable): function filtering or projecting each chunk after `filter_column`
+        chunksize (int): number of rows read at a time
+    Returns:
+        df (pd.DataFrame): filtered dataframe
+    """
+    chunks = []
+    for chunk in pd.read_csv(
+        path, sep="\t", usecols=list(usecols), dtype=dtype, chunksize=chunksize
+    ):
+        if filter_column is not None:
+            chunk = chunk[chunk[filter_column] == filter_value]
+        if transform is not None:
+            chunk = transform(chunk)
+        chunks.append(chunk)
+
+    df = pd.concat(chunks)
+    if (
+        filter_column in df.columns
+        and isinstance(df[filter_column].dtype, pd.CategoricalDtype)
+    ):
+        # Categories of each chunk may differ, so we restore a plain string column after filtering
+        df[filter_column] = df[filter_column].astype(str)
+    return df
+
+
+def save_data(df, output_dir, name, output_format="csv"):
+    """
+    Save dataframe to `output_dir` in the requested format
+
+    Args:
+        df (pd.DataFrame): dataframe to save
+        output_dir (Path): directory to save the dataframe in
+        name (str): file name without extension
+        output_format (str): either "csv" or "parquet"
+    """
+    if output_format == "csv":
+        save_data_csv(df, f"{output_dir}/{name}.csv")
+    elif output_format == "parquet":
+        save_data_parquet(df, f"{output_dir}/{name}.parquet")
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+
 def save_data_csv(df, path):
     """
-    Save dataframe to csv file
+    Save dataframe to csv file. IMDb identifier columns are written in their original string form
 
     Args:
         df (pd.DataFrame): dataframe to save
@@ -419,45 +762,314 @@ def save_data_csv(df, path):
     try:
         path = Path(path)
         path.parent.mkdir(parents=True, exist_ok=True)
+        df = df.copy()
+        for column, prefix in IMDB_ID_COLUMNS.items():
+            if column in df.columns:
+                df[column] = format_imdb_id(df[column], prefix)
         df.to_csv(path, index=False)
         print(f"Data saved to {path}, shape: {df.shape}")
     except Exception as e:
         print(f"Error saving data: {e}")
 
 
-def extract_year(date):
+def save_data_parquet(df, path):
+    """
+    Save dataframe to a Parquet file. Year columns are stored as nullable integers and string
+    columns are dictionary-encoded, so that loaders can read only the columns and rows they need
+
+    Args:
+        df (pd.DataFrame): dataframe to save
+        path (str): path to save the dataframe
+    """
+    try:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df = df.copy()
+        for column in PARQUET_YEAR_COLUMNS:
+            if column in df.columns:
+                df[column] = pd.to_numeric(df[column], errors="coerce").astype("Int16")
+        df.to_parquet(path, index=False, engine="pyarrow", use_dictionary=True)
+        print(f"Data saved to {path}, shape: {df.shape}")
+    except Exception as e:
+        print(f"Error saving data: {e}")
+
+
+def encode_imdb_id(ids):
+    """
+    Encode IMDb identifiers such as "tt0111161" or "nm0000123" as integer codes by dropping their
+    two-letter prefix. Joins and groupbys on the codes run on fixed-width integers instead of strings
+
+    Args:
+        ids (pd.Series): IMDb identifiers
+    Returns:
+        codes (pd.Series): nullable integer codes, missing where the identifier is missing or invalid
+    """
+    return pd.to_numeric(ids.str.slice(2), errors="coerce").astype("Int32")
+
+
+def format_imdb_id(codes, prefix):
+    """
+    Format integer codes back to IMDb identifiers, the inverse of `encode_imdb_id`. IMDb pads the
+    numeric part to at least 7 digits
+
+    Args:
+        codes (pd.Series): integer codes
+        prefix (str): identifier prefix, "tt" for titles and "nm" for names
+    Returns:
+        ids (pd.Series): IMDb identifiers, missing where the code is missing
+    """
+    return prefix + codes.astype("Int32").astype("string").str.zfill(7)
+
+
+def extract_release_date_features(dates):
+    """
+    Extract year, month and typed date from date strings in a single vectorized pass. Dates are
+    separated by '-' where the first element is the year, and may be partial: year-only dates
+    have a missing month, and only complete dates get a typed date, so that no month or day is
+    made up for partial dates
+
+    Args:
+        dates (pd.Series): date strings such as "1987", "1987-06" or "1987-06-12"
+    Returns:
+        df_dates (pd.DataFrame): `release_year` (Int16), `release_month` (Int8) and
+        `release_datetime` (datetime64, NaT for partial dates) columns, with the same index as
+        `dates`
+    """
+    parts = dates.astype(str).str.extract(
+        r"^(?P<year>[^-]*)(?:-(?P<month>\d{1,2}))?(?:-(?P<day>\d{1,2}))?"
+    )
+    year = pd.to_numeric(parts["year"], errors="coerce").astype("Int16")
+    month = pd.to_numeric(parts["month"], errors="coerce").astype("Int8")
+    day = pd.to_numeric(parts["day"], errors="coerce").astype("Int8")
+
+    release_datetime = pd.to_datetime(
+        pd.DataFrame(
+            {
+                "year": year.astype("float64"),
+                "month": month.astype("float64"),
+                "day": day.astype("float64"),
+            }
+        ),
+        errors="coerce",
+    )
+    return pd.DataFrame(
+        {
+            "release_year": year,
+            "release_month": month,
+            "release_datetime": release_datetime,
+        },
+        index=dates.index,
+    )
+
+
+def normalize_title_key(titles):
+    """
+    Compute an integer key for each title that ignores case, accents and punctuation, so that
+    titles such as "Amélie" and "Amelie!" share the same key
+
+    Args:
+        titles (pd.Series): movie titles
+    Returns:
+        title_keys (pd.Series): 64-bit hash of each normalized title, missing for titles that are
+        empty once normalized
+    """
+    normalized = (
+        titles.astype(object)
+        .str.normalize("NFKD")
+        .str.replace("[\u0300-\u036f]", "", regex=True)
+        .str.casefold()
+        .str.replace(r"[\W_]+", " ", regex=True)
+        .str.strip()
+    )
+    normalized = normalized.mask(normalized == "")
+    title_keys = pd.util.hash_pandas_object(normalized, index=False).astype("UInt64")
+    return title_keys.mask(normalized.isna())
+
+
+def link_cmu_movie_metadata_and_tmdb(df_cmu_movie_metadata, df_tmdb, year_tolerance=0):
+    """
+    Match CMU movies to TMDb movies on their normalized title key and release year. With a
+    positive `year_tolerance`, CMU movies without an exact year match are matched to the TMDb
+    movies with the same title released the closest number of years apart, up to the tolerance
+
+    Args:
+        df_cmu_movie_metadata (pd.DataFrame): CMU movie metadata
+        df_tmdb (pd.DataFrame): TMDb dataset
+        year_tolerance (int): maximum number of years between matched release years
+    Returns:
+        df_cmu_tmdb_links (pd.DataFrame): link table with `wikipedia_movie_id`, `tmdb_id` and the
+        `year_offset` between the TMDb and CMU release years
+    """
+    if year_tolerance < 0:
+        raise ValueError(f"year_tolerance must be non-negative, got {year_tolerance}")
+
+    df_cmu_keys = pd.DataFrame(
+        {
+            "wikipedia_movie_id": df_cmu_movie_metadata["wikipedia_movie_id"],
+            "title_key": normalize_title_key(df_cmu_movie_metadata["name"]),
+            "release_year": df_cmu_movie_metadata["release_year"],
+        }
+    ).dropna()
+    df_tmdb_keys = pd.DataFrame(
+        {
+            "tmdb_id": df_tmdb["id"],
+            "title_key": normalize_title_key(df_tmdb["title"]),
+            "release_year": df_tmdb["release_year"],
+        }
+    ).dropna()
+
+    df_cmu_tmdb_links = match_titles_by_year(
+        df_cmu_keys, df_tmdb_keys, "wikipedia_movie_id", year_tolerance
+    )
+    return df_cmu_tmdb_links[["wikipedia_movie_id", "tmdb_id", "year_offset"]].reset_index(
+        drop=True
+    )
+
+
+def match_titles_by_year(df_left_keys, df_right_keys, left_id_column, year_tolerance=0):
+    """
+    Match movies on their normalized title key and release year, keeping for each left movie only
+    the matches with the smallest number of years apart, up to `year_tolerance`
+
+    Args:
+        df_left_keys (pd.DataFrame): left movies with their id, `title_key` and `release_year`
+        df_right_keys (pd.DataFrame): right movies with their id, `title_key` and `release_year`
+        left_id_column (str): id column of the left movies
+        year_tolerance (int): maximum number of years between matched release years
+    Returns:
+        df_matches (pd.DataFrame): matched ids with the `year_offset` between the right and left
+        release years
+    """
+    # Join the left keys shifted by each allowed year offset, and keep for each left movie only
+    # the matches with the smallest offset
+    df_candidates = []
+    for year_offset in range(-year_tolerance, year_tolerance + 1):
+        df_shifted = df_left_keys.assign(
+            release_year=df_left_keys["release_year"] + year_offset,
+            year_offset=year_offset,
+        )
+        df_candidates.append(
+            df_shifted.merge(df_right_keys, on=["title_key", "release_year"])
+        )
+    df_matches = pd.concat(df_candidates, ignore_index=True)
+
+    distance = df_matches["year_offset"].abs()
+    closest = distance.groupby(df_matches[left_id_column]).transform("min")
+    return df_matches[distance == closest]
+
+
+def link_cmu_movie_metadata_and_imdb(
+    df_cmu_movie_metadata, df_imdb_movies, df_cmu_tmdb, year_tolerance=0
+):
+    """
+    Link CMU movies to IMDb movies. CMU movies matched to TMDb are linked through the IMDb id of
+    their TMDb movie. The remaining CMU movies are matched to the remaining IMDb movies on their
+    normalized title key and release year, up to `year_tolerance` years apart. Ambiguous links,
+    where a CMU or IMDb movie would be linked to several movies, are dropped so that joining the
+    links never multiplies rows, e.g. for remakes sharing their title
+
+    Args:
+        df_cmu_movie_metadata (pd.DataFrame): CMU movie metadata
+        df_imdb_movies (pd.DataFrame): IMDb movies with ratings, one row per movie
+        df_cmu_tmdb (pd.DataFrame): merged CMU movie metadata and TMDb dataset, with IMDb ids
+        year_tolerance (int): maximum number of years between release years matched by title
+    Returns:
+        df_cmu_imdb_links (pd.DataFrame): one-to-one link table with `wikipedia_movie_id`,
+        `movie_id`, `matched_on` ("imdb_id" or "title") and the `year_offset` between the IMDb
+        and CMU release years of title matches
+    """
+    if year_tolerance < 0:
+        raise ValueError(f"year_tolerance must be non-negative, got {year_tolerance}")
+
+    df_id_links = (
+        df_cmu_tmdb[["wikipedia_movie_id", "imdb_id"]]
+        .dropna()
+        .drop_duplicates()
+        .rename(columns={"imdb_id": "movie_id"})
+    )
+    df_id_links = df_id_links[df_id_links["movie_id"].isin(df_imdb_movies["movie_id"])]
+    df_id_links = drop_ambiguous_links(df_id_links)
+    df_id_links = df_id_links.assign(
+        matched_on="imdb_id",
+        year_offset=pd.array([pd.NA] * len(df_id_links), dtype="Int8"),
+    )
+
+    # Fall back to titles and release years for the movies without an id link
+    df_cmu_keys = pd.DataFrame(
+        {
+            "wikipedia_movie_id": df_cmu_movie_metadata["wikipedia_movie_id"],
+            "title_key": normalize_title_key(df_cmu_movie_metadata["name"]),
+            "release_year": df_cmu_movie_metadata["release_year"],
+        }
+    ).dropna()
+    df_cmu_keys = df_cmu_keys[
+        ~df_cmu_keys["wikipedia_movie_id"].isin(df_id_links["wikipedia_movie_id"])
+    ]
+    df_imdb_keys = pd.DataFrame(
+        {
+            "movie_id": df_imdb_movies["movie_id"],
+            "title_key": normalize_title_key(df_imdb_movies["movie_name"]),
+            "release_year": df_imdb_movies["movie_release_year"],
+        }
+    ).dropna()
+    df_imdb_keys = df_imdb_keys[~df_imdb_keys["movie_id"].isin(df_id_links["movie_id"])]
+
+    df_title_links = match_titles_by_year(
+        df_cmu_keys, df_imdb_keys, "wikipedia_movie_id", year_tolerance
+    )
+    df_title_links = drop_ambiguous_links(
+        df_title_links[["wikipedia_movie_id", "movie_id", "year_offset"]]
+    ).astype({"year_offset": "Int8"})
+    df_title_links = df_title_links.assign(matched_on="title")
+
+    df_cmu_imdb_links = pd.concat([df_id_links, df_title_links], ignore_index=True)
+    check_unique_ids(df_cmu_imdb_links, "wikipedia_movie_id", "CMU to IMDb links")
+    check_unique_ids(df_cmu_imdb_links, "movie_id", "CMU to IMDb links")
+    return df_cmu_imdb_links[["wikipedia_movie_id", "movie_id", "matched_on", "year_offset"]]
+
+
+def drop_ambiguous_links(df_links):
     """
-    Extract year from date string
+    Drop the links of CMU movies linked to several IMDb movies and of IMDb movies linked to
+    several CMU movies
 
     Args:
-        date: date separated by '-' where the first element is the year
+        df_links (pd.DataFrame): links with `wikipedia_movie_id` and `movie_id` columns
     Returns:
-        year (str): year extracted from the date string
+        df_links (pd.DataFrame): one-to-one links
     """
-    if date:
-        return str(date).split("-")[0]
-    return None
+    ambiguous = df_links["wikipedia_movie_id"].duplicated(keep=False) | df_links[
+        "movie_id"
+    ].duplicated(keep=False)
+    return df_links[~ambiguous]
 
 
-def merge_cmu_movie_metadata_and_tmdb(df_cmu_movie_metadata, df_tmdb):
+def merge_cmu_movie_metadata_and_tmdb(df_cmu_movie_metadata, df_tmdb, df_cmu_tmdb_links):
     """
     Join CMU movie metadata with TMDb dataset to fill in missing information such as revenue which has a lot of missing values
 
     Args:
         df_cmu_movie_metadata (pd.DataFrame): CMU movie metadata
         df_tmdb (pd.DataFrame): TMDb dataset
+        df_cmu_tmdb_links (pd.DataFrame): CMU to TMDb link table from `link_cmu_movie_metadata_and_tmdb`
     Returns:
         df_cmu_tmdb (pd.DataFrame): merged CMU movie metadata and TMDb dataset
     """
     df_cmu_movie_metadata_selected = df_cmu_movie_metadata[
-        ["wikipedia_movie_id", "freebase_movie_id", "name", "release_year"]
+        ["wikipedia_movie_id", "freebase_movie_id", "name"]
     ]
     df_cmu_tmdb = pd.merge(
         df_tmdb,
+        df_cmu_tmdb_links[["wikipedia_movie_id", "tmdb_id"]],
+        how="inner",
+        left_on="id",
+        right_on="tmdb_id",
+    ).drop(columns=["tmdb_id"])
+    df_cmu_tmdb = pd.merge(
+        df_cmu_tmdb,
         df_cmu_movie_metadata_selected,
         how="inner",
-        left_on=["title", "release_year"],
-        right_on=["name", "release_year"],
+        on="wikipedia_movie_id",
     )
 
     # Remove movies with missing imdb because we need it for the tropes analysis
@@ -465,19 +1077,22 @@ def merge_cmu_movie_metadata_and_tmdb(df_cmu_movie_metadata, df_tmdb):
     return df_cmu_tmdb
 
 
-def merge_cmu_and_imdb_directors_actors(
-    df_cmu_character_metadata, df_cmu_movie_metadata, df_imdb_directors_actors
+def merge_cmu_characters_and_imdb_movies(
+    df_cmu_character_metadata, df_cmu_movie_metadata, df_imdb_movies, df_cmu_imdb_links
 ):
     """
-    Merge CMU movie character metadata with IMDb directors and actors dataset
+    Merge CMU movie character metadata with IMDb movie ratings
 
     Args:
         df_cmu_character_metadata (pd.DataFrame): CMU character metadata
         df_cmu_movie_metadata (pd.DataFrame): CMU movie metadata
-        df_imdb_directors_actors (pd.DataFrame): IMDb directors and actors dataset
+        df_imdb_movies (pd.DataFrame): IMDb movies with ratings, one row per movie
+        df_cmu_imdb_links (pd.DataFrame): CMU to IMDb link table from
+            `link_cmu_movie_metadata_and_imdb`
     Returns:
-        df_movie_actors (pd.DataFrame): merged CMU movie character metadata and IMDb directors and actors dataset
+        df_movie_actors (pd.DataFrame): merged CMU movie character metadata and IMDb movie ratings
     """
+    check_unique_ids(df_imdb_movies, "movie_id", "IMDb movies")
 
     df_cmu_movie_character = pd.merge(
         df_cmu_character_metadata,
@@ -486,20 +1101,24 @@ def merge_cmu_and_imdb_directors_actors(
         how="inner",
     )
 
-    # Merge the result with movie ratings
-    df_imdb_movie_rating = df_imdb_directors_actors[
-        ["movie_name", "average_rating", "num_votes"]
-    ]
+    # Merge the result with movie ratings of the IMDb movie linked to each CMU movie
+    df_imdb_movie_rating = pd.merge(
+        df_cmu_imdb_links[["wikipedia_movie_id", "movie_id"]],
+        df_imdb_movies[["movie_id", "movie_name", "average_rating", "num_votes"]],
+        on="movie_id",
+        how="inner",
+        validate="one_to_one",
+    )
     df_movie_actors = pd.merge(
         df_cmu_movie_character,
         df_imdb_movie_rating,
-        left_on="name",
-        right_on="movie_name",
+        on="wikipedia_movie_id",
         how="inner",
+        validate="many_to_one",
     )
 
-    # Drop redundant `name` column from CMU movie meta data after merge
-    df_movie_actors = df_movie_actors.drop(columns=["name"])
+    # Drop redundant `name` column from CMU movie meta data and the link id after merge
+    df_movie_actors = df_movie_actors.drop(columns=["name", "movie_id"])
     return df_movie_actors
 
 
@@ -514,7 +1133,7 @@ def merge_cmu_tropes(df_cmu_tmdb, df_imdb_movie_tropes):
         df_cmu_tropes (pd.DataFrame): merged CMU and IMDb movie tropes dataset
     """
     # To remove duplicated columns, we will drop genres from the IMDb movie tropes dataset
-    df_imdb_movie_tropes.drop(columns=["genres"], inplace=True)
+    df_imdb_movie_tropes = df_imdb_movie_tropes.drop(columns=["genres"])
 
     df_cmu_tropes = pd.merge(
         df_cmu_tmdb,
@@ -545,7 +1164,8 @@ def merge_cmu_tropes(df_cmu_tmdb, df_imdb_movie_tropes):
 def merge_cmu_ml_ratings(df_cmu_tropes, df_ml_ratings):
     """
     Merge CMU and MovieLens ratings datasets to analyze the relationship
-    between tropes and ratings
+    between tropes and ratings. Each movie's tropes are merged once per row of
+    `df_ml_ratings`, either per-movie rating statistics or individual ratings
 
     Args:
         df_cmu_tropes (pd.DataFrame): CMU and IMDb movie tropes dataset
@@ -572,5 +1192,333 @@ def merge_cmu_ml_ratings(df_cmu_tropes, df_ml_ratings):
     return df_cmu_tropes_ratings
 
 
+def define_stage(func, inputs=None, params=None, deps=None):
+    """
+    Define a preprocessing stage. The stage is run as `func(**inputs, **params, **deps)`, where each
+    dependency is replaced by the output of the upstream stage it names. `func` must be defined at
+    module level so that it can be sent to worker processes
+
+    Args:
+        func (callable): module-level function computing the stage output
+        inputs (dict): argument name to input file path, hashed to detect changes
+        params (dict): argument name to parameter value
+        deps (dict): argument name to upstream stage name, or to a (stage name, index) tuple
+            when the upstream stage returns a tuple
+    Returns:
+        stage (dict): stage definition
+    """
+    return {
+        "func": func,
+        "inputs": inputs or {},
+        "params": params or {},
+        "deps": deps or {},
+    }
+
+
+def run_stages(stages, cache_dir=None, max_workers=1):
+    """
+    Run preprocessing stages as soon as the stages they depend on are done. With `max_workers`
+    greater than one, independent stages run concurrently in a process pool, so the run takes
+    about as long as the longest chain of dependent stages (at the cost of holding the data of
+    several stages in memory at once).
+
+    When `cache_dir` is given, the output of each stage is cached on disk under a key built from
+    its input files, parameters, code and the keys of its upstream stages. A stage whose key did
+    not change is loaded from the cache instead of being run, and any change in an upstream stage
+    changes the keys of all stages that depend on it
+
+    Args:
+        stages (dict): stage name to stage definition
+        cache_dir (Path): path to cache stage outputs, or None to disable caching
+        max_workers (int): number of worker processes running stages concurrently
+    Returns:
+        outputs (dict): stage name to stage output
+    """
+    # Stage keys are only needed, and input files only hashed, when caching is enabled
+    keys = {}
+    if cache_dir is not None:
+        file_hashes = load_file_hashes(cache_dir)
+        for name in sort_stages(stages):
+            keys[name] = compute_stage_key(name, stages[name], keys, file_hashes)
+        save_file_hashes(cache_dir, file_hashes)
+    else:
+        sort_stages(stages)  # Validate the dependencies even without cache
+
+    outputs, pending, running = {}, dict(stages), {}
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    try:
+        while pending or running:
+            ready = [
+                name
+                for name, stage in pending.items()
+                if all(dep in outputs for dep in get_stage_dependencies(stage))
+            ]
+            for name in ready:
+                stage = pending.pop(name)
+                cache_path = get_stage_cache_path(cache_dir, name, keys.get(name))
+                if cache_path is not None and cache_path.exists():
+                    print(f"Stage {name} is up to date, loading cached output...")
+                    outputs[name] = pd.read_pickle(cache_path)
+                elif executor is None:
+                    print(f"Running stage {name}...")
+                    outputs[name] = stage["func"](
+                        **resolve_stage_arguments(stage, outputs)
+                    )
+                    save_stage_output(outputs[name], cache_path)
+                else:
+                    print(f"Starting stage {name}...")
+                    future = executor.submit(
+                        stage["func"], **resolve_stage_arguments(stage, outputs)
+                    )
+                    running[future] = name
+
+            if ready:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                outputs[name] = future.result()
+                print(f"Stage {name} finished")
+                save_stage_output(
+                    outputs[name], get_stage_cache_path(cache_dir, name, keys.get(name))
+                )
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    return outputs
+
+
+def sort_stages(stages):
+    """
+    Sort stages so that every stage comes after the stages it depends on
+
+    Args:
+        stages (dict): stage name to stage definition
+    Returns:
+        names (list): stage names in dependency order
+    """
+    names, visiting = [], set()
+
+    def visit(name):
+        if name in names:
+            return
+        if name in visiting:
+            raise ValueError(f"Circular dependency on stage {name}")
+        if name not in stages:
+            raise ValueError(f"Unknown stage {name}")
+        visiting.add(name)
+        for dep in get_stage_dependencies(stages[name]):
+            visit(dep)
+        visiting.remove(name)
+        names.append(name)
+
+    for name in stages:
+        visit(name)
+    return names
+
+
+def get_stage_dependencies(stage):
+    """
+    Get the names of the upstream stages of a stage
+
+    Args:
+        stage (dict): stage definition
+    Returns:
+        dep_names (list): sorted names of the upstream stages
+    """
+    dep_names = [
+        dep[0] if isinstance(dep, tuple) else dep for dep in stage["deps"].values()
+    ]
+    return sorted(set(dep_names))
+
+
+def get_stage_cache_path(cache_dir, name, key):
+    """
+    Get the path of the cached output of a stage
+
+    Args:
+        cache_dir (Path): path of the stage cache, or None when caching is disabled
+        name (str): stage name
+        key (str): cache key of the stage
+    Returns:
+        cache_path (Path): path of the cached output, or None when caching is disabled
+    """
+    if cache_dir is None:
+        return None
+    return Path(cache_dir) / f"{name}-{key[:16]}.pkl"
+
+
+def save_stage_output(output, cache_path):
+    """
+    Cache the output of a stage, replacing the outputs cached for older versions of the stage
+
+    Args:
+        output: stage output
+        cache_path (Path): path of the cached output, or None when caching is disabled
+    """
+    if cache_path is None:
+        return
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    stage_name = cache_path.name.rsplit("-", 1)[0]
+    for stale_path in cache_path.parent.glob(f"{stage_name}-*.pkl"):
+        stale_path.unlink()
+    pd.to_pickle(output, cache_path)
+
+
+def resolve_stage_arguments(stage, outputs):
+    """
+    Build the keyword arguments of a stage from its inputs, parameters and upstream outputs
+
+    Args:
+        stage (dict): stage definition
+        outputs (dict): stage name to output of the stages that already ran
+    Returns:
+        kwargs (dict): keyword arguments of the stage function
+    """
+    kwargs = {**stage["inputs"], **stage["params"]}
+    for arg, dep in stage["deps"].items():
+        if isinstance(dep, tuple):
+            dep_name, index = dep
+            kwargs[arg] = outputs[dep_name][index]
+        else:
+            kwargs[arg] = outputs[dep]
+    return kwargs
+
+
+def compute_stage_key(name, stage, keys, file_hashes):
+    """
+    Compute the cache key of a stage from its input files, parameters, code and upstream keys
+
+    Args:
+        name (str): stage name
+        stage (dict): stage definition
+        keys (dict): stage name to cache key of the upstream stages
+        file_hashes (dict): cache of input file hashes, updated in place
+    Returns:
+        key (str): hexadecimal cache key
+    """
+    key_data = {
+        "name": name,
+        "code": get_function_source(stage["func"]),
+        "inputs": {
+            arg: hash_file(path, file_hashes) for arg, path in stage["inputs"].items()
+        },
+        "params": {arg: repr(value) for arg, value in stage["params"].items()},
+        "deps": {dep_name: keys[dep_name] for dep_name in get_stage_dependencies(stage)},
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+
+def get_function_source(func, seen=None):
+    """
+    Get the source code of a function, of the module-level functions it calls and the value of
+    the module-level constants it uses, so that editing a helper or a constant such as
+    `IMDB_ID_COLUMNS` also invalidates the stages using it
+
+    Args:
+        func (callable): function to inspect
+        seen (set): names of the functions and constants already collected
+    Returns:
+        source (str): concatenated source code and constant values
+    """
+    seen = set() if seen is None else seen
+    seen.add(func.__name__)
+    sources = [inspect.getsource(func)]
+    for name in get_global_names(func.__code__):
+        if name in seen or name not in func.__globals__:
+            continue
+        value = func.__globals__[name]
+        if inspect.isfunction(value):
+            if value.__module__ == func.__module__:
+                sources.append(get_function_source(value, seen))
+        elif not (inspect.ismodule(value) or inspect.isclass(value) or callable(value)):
+            seen.add(name)
+            sources.append(f"{name} = {value!r}")
+    return "\n".join(sources)
+
+
+def get_global_names(code):
+    """
+    Get the names used by a code object, including those used by its nested functions, lambdas
+    and comprehensions
+
+    Args:
+        code (types.CodeType): code object to inspect
+    Returns:
+        names (list): names in order of first use
+    """
+    names = list(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names.extend(get_global_names(const))
+    return list(dict.fromkeys(names))
+
+
+def hash_file(path, file_hashes):
+    """
+    Hash the content of a file. Hashes are reused while the size and modification time of the
+    file are unchanged, so large unchanged dumps are not read again
+
+    Args:
+        path (Path): path to the file
+        file_hashes (dict): cache of file hashes, updated in place
+    Returns:
+        file_hash (str): hexadecimal SHA-256 hash of the file content
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    cached = file_hashes.get(str(path))
+    if (
+        cached is not None
+        and cached["size"] == stat.st_size
+        and cached["mtime_ns"] == stat.st_mtime_ns
+    ):
+        return cached["sha256"]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            digest.update(block)
+
+    file_hashes[str(path)] = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+    return file_hashes[str(path)]["sha256"]
+
+
+def load_file_hashes(cache_dir):
+    """
+    Load the cached input file hashes
+
+    Args:
+        cache_dir (Path): path of the stage cache
+    Returns:
+        file_hashes (dict): file path to size, modification time and hash
+    """
+    path = Path(cache_dir) / "file_hashes.json"
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_file_hashes(cache_dir, file_hashes):
+    """
+    Save the input file hashes next to the stage cache
+
+    Args:
+        cache_dir (Path): path of the stage cache
+        file_hashes (dict): file path to size, modification time and hash
+    """
+    path = Path(cache_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / "file_hashes.json", "w") as f:
+        json.dump(file_hashes, f, indent=2)
+
+
 if __name__ == "__main__":
     CLI(preprocess_data)
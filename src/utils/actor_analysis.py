@@ -1,13 +1,20 @@
+import hashlib
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+import pyarrow.feather as feather
+
+from functools import cached_property
+from pathlib import Path
+
+from ..utils.data_utils import load_data
 
 def actor_analysis(data_path, ethnicity_mapping_path):
     # 1. Load the dataset
-    df_movie_actors = pd.read_csv(data_path)
+    df_movie_actors = load_data(data_path)
 
     # Display the first few rows
     print("First few rows of the dataset:")
@@ -111,46 +118,37 @@ def actor_analysis(data_path, ethnicity_mapping_path):
 
     # 5. Assessing diversity per movie
 
-    # Group data by movie
-    grouped = df_movie_actors.groupby("movie_name")
-
-    # 5.1 Compute diversity metrics
-    def compute_diversity_metrics(group):
-        # Count unique actors for each movie
-        num_actors = group["actor_name"].nunique()
-        
-        # Count unique female actors
-        num_female = group[group["actor_gender"] == "F"]["actor_name"].nunique()
-        
-        # Count unique male actors
-        num_male = group[group["actor_gender"] == "M"]["actor_name"].nunique()
-        
-        # Calculate gender diversity (proportion of female actors)
-        gender_diversity = num_female / num_actors if num_actors else np.nan
-        
-        # Calculate other metrics
-        num_ethnicities = group["actor_ethnicity"].nunique()
-        age_std = group["actor_age_at_movie_release"].std()
-        revenue = group["revenue"].mean()
-        average_rating = group["average_rating"].mean()
-        num_votes = group["num_votes"].sum()
-        
-        return pd.Series(
-            {
-                "num_actors": num_actors,
-                "num_male": num_male,
-                "num_female": num_female,
-                "gender_diversity": gender_diversity,
-                "num_ethnicities": num_ethnicities,
-                "age_std": age_std,
-                "revenue": revenue,
-                "average_rating": average_rating,
-                "num_votes": num_votes,
-            }
+    # 5.1 Compute diversity metrics for each movie in a single groupby
+    movie_metrics = (
+        df_movie_actors.assign(
+            female_actor=df_movie_actors["actor_name"].where(
+                df_movie_actors["actor_gender"] == "F"
+            ),
+            male_actor=df_movie_actors["actor_name"].where(
+                df_movie_actors["actor_gender"] == "M"
+            ),
         )
+        .groupby("movie_name")
+        .agg(
+            num_actors=("actor_name", "nunique"),
+            num_male=("male_actor", "nunique"),
+            num_female=("female_actor", "nunique"),
+            num_ethnicities=("actor_ethnicity", "nunique"),
+            age_std=("actor_age_at_movie_release", "std"),
+            revenue=("revenue", "mean"),
+            average_rating=("average_rating", "mean"),
+            num_votes=("num_votes", "sum"),
+        )
+    )
 
-    # Apply the function to each movie group
-    movie_metrics = grouped.apply(compute_diversity_metrics).reset_index()
+    # Calculate the proportion of female actors. It is named `female_share` to tell it apart from
+    # the `gender_diversity` entropy of the RQ2 diversity dataset
+    movie_metrics.insert(
+        3,
+        "female_share",
+        movie_metrics["num_female"] / movie_metrics["num_actors"].replace(0, np.nan),
+    )
+    movie_metrics = movie_metrics.reset_index()
 
     # Display the metrics
     print("\nDiversity metrics for movies:")
@@ -161,7 +159,7 @@ def actor_analysis(data_path, ethnicity_mapping_path):
     # 6.1 Correlation Analysis
     # Select relevant columns for correlation
     corr_columns = [
-        "gender_diversity",
+        "female_share",
         "num_ethnicities",
         "age_std",
         "revenue",
@@ -182,20 +180,20 @@ def actor_analysis(data_path, ethnicity_mapping_path):
 
     # 6.3 Scatter plots
 
-    # 6.3.1 Gender Diversity vs. Revenue
+    # 6.3.1 Female Share vs. Revenue
     plt.figure(figsize=(10, 6))
-    sns.scatterplot(x="gender_diversity", y="revenue", data=movie_metrics)
-    plt.title("Gender Diversity vs. Revenue")
-    plt.xlabel("Gender Diversity (Proportion of Female Actors)")
+    sns.scatterplot(x="female_share", y="revenue", data=movie_metrics)
+    plt.title("Female Share vs. Revenue")
+    plt.xlabel("Female Share (Proportion of Female Actors)")
     plt.ylabel("Revenue")
     plt.ylim(0, 1.5e9)  # Limit y-axis for better visualization
     plt.show()
 
-    # 6.3.2 Gender Diversity vs. Average Rating
+    # 6.3.2 Female Share vs. Average Rating
     plt.figure(figsize=(10, 6))
-    sns.scatterplot(x="gender_diversity", y="average_rating", data=movie_metrics)
-    plt.title("Gender Diversity vs. Average Rating")
-    plt.xlabel("Gender Diversity (Proportion of Female Actors)")
+    sns.scatterplot(x="female_share", y="average_rating", data=movie_metrics)
+    plt.title("Female Share vs. Average Rating")
+    plt.xlabel("Female Share (Proportion of Female Actors)")
     plt.ylabel("Average Rating")
     plt.show()
 
@@ -232,150 +230,329 @@ def actor_analysis(data_path, ethnicity_mapping_path):
     plt.ylabel("Average Rating")
     plt.show()
 
-def rq2_display_correlation_heatmap(file_path):
+def compute_shannon_entropy(df, group_column, value_column):
     """
-    Displays a correlation heatmap for diversity metrics and revenue/average rating.
+    Computes the Shannon entropy (in bits) of a categorical column within each group.
 
     Parameters:
-    - file_path (str): Path to the JSON file containing the dataset.
+    - df (pd.DataFrame): Dataset with one row per observation.
+    - group_column (str): Column identifying the groups.
+    - value_column (str): Categorical column whose distribution is measured.
 
     Returns:
-    - None
+    - pd.Series: Entropy of each group.
     """
-    movies_df = pd.read_json(file_path)
-    correlation_matrix = movies_df.drop(columns=["wikipedia_movie_id"]).corr()
-    heatmap_fig = px.imshow(
-        correlation_matrix,
-        text_auto=True,
-        title="Correlation Between Diversity Metrics and Revenue/Average Rating",
-        color_continuous_scale="Viridis",
-    )
-    heatmap_fig.update_layout(
-        template="plotly_white", title_x=0.5, width=700, height=700
-    )
-    heatmap_fig.show()
+    counts = df.groupby([group_column, value_column]).size()
+    p = counts / counts.groupby(level=0).transform("sum")
+    return -(p * np.log2(p)).groupby(level=0).sum()
 
-def rq2_display_diversity_boxplots(file_path):
+
+def compute_diversity_metrics(df_movie_actors, ethnicity_mapping_path):
     """
-    Displays boxplots for revenue and average rating grouped by diversity groups.
+    Computes the diversity metrics of each movie: the standard deviation of actor ages and
+    heights, and the Shannon entropy of actor genders and ethnicities. Unlike the `female_share`
+    of `actor_analysis`, `gender_diversity` is the entropy of the gender distribution.
 
     Parameters:
-    - file_path (str): Path to the JSON file containing the dataset.
+    - df_movie_actors (pd.DataFrame): Dataset with one row per movie actor.
+    - ethnicity_mapping_path (str): Path to the CSV file mapping Freebase ids to ethnicities.
 
     Returns:
-    - None
+    - pd.DataFrame: One row per movie with its diversity metrics, average rating and revenue.
     """
-    movies_df = pd.read_json(file_path)
-
-    # Define diversity groups for each diversity factor
-    for factor in ["age_diversity", "gender_diversity", "height_diversity", "ethnicity_diversity"]:
-        movies_df[f"{factor}_group"] = pd.qcut(
-            movies_df[factor], q=4, labels=["Low", "Medium", "High", "Very High"]
-        )
+    df_movie_actors = df_movie_actors.drop_duplicates()
 
-    # Revenue Boxplot
-    revenue_box_fig = px.box(
-        movies_df.melt(
-            id_vars=["revenue"], 
-            value_vars=[f"{factor}_group" for factor in ["age_diversity", "gender_diversity", "height_diversity", "ethnicity_diversity"]],
-            var_name="Diversity Factor", 
-            value_name="Group"
-        ),
-        x="Group",
-        y="revenue",
-        color="Diversity Factor",
-        title="Revenue by Diversity Groups",
-        labels={"Group": "Diversity Group", "revenue": "Revenue"},
-        color_discrete_sequence=px.colors.qualitative.Set2,
+    ethnicity_mapping_df = pd.read_csv(ethnicity_mapping_path)
+    ethnicity_mapping = pd.Series(
+        ethnicity_mapping_df["itemLabel"].values,
+        index=ethnicity_mapping_df["freebase_id"],
     )
-    revenue_box_fig.update_layout(
-        template="plotly_white", title_x=0.5,
-        xaxis=dict(categoryorder="array", categoryarray=["Low", "Medium", "High", "Very High"])
+    df_movie_actors = df_movie_actors.assign(
+        ethnicity_label=df_movie_actors["actor_ethnicity_freebase_id"]
+        .map(ethnicity_mapping)
+        .fillna("Unknown")
     )
-    revenue_box_fig.show()
-
-    # Average Rating Boxplot
-    rating_box_fig = px.box(
-        movies_df.melt(
-            id_vars=["average_rating"], 
-            value_vars=[f"{factor}_group" for factor in ["age_diversity", "gender_diversity", "height_diversity", "ethnicity_diversity"]],
-            var_name="Diversity Factor", 
-            value_name="Group"
-        ),
-        x="Group",
-        y="average_rating",
-        color="Diversity Factor",
-        title="Average Rating by Diversity Groups",
-        labels={"Group": "Diversity Group", "average_rating": "Average Rating"},
-        color_discrete_sequence=px.colors.qualitative.Set2,
+    df_movie_actors = df_movie_actors[df_movie_actors["actor_gender"].isin(["M", "F"])]
+
+    movies_df = df_movie_actors.groupby("wikipedia_movie_id").agg(
+        age_diversity=("actor_age_at_movie_release", "std"),
+        height_diversity=("actor_height_in_meters", "std"),
+        average_rating=("average_rating", "first"),
+        revenue=("revenue", "first"),
+    )
+    # Movies with a single actor, or without known ages or heights, have no spread
+    movies_df[["age_diversity", "height_diversity"]] = movies_df[
+        ["age_diversity", "height_diversity"]
+    ].fillna(0.0)
+
+    movies_df.insert(
+        1,
+        "gender_diversity",
+        compute_shannon_entropy(df_movie_actors, "wikipedia_movie_id", "actor_gender"),
     )
-    rating_box_fig.update_layout(
-        template="plotly_white", title_x=0.5,
-        xaxis=dict(categoryorder="array", categoryarray=["Low", "Medium", "High", "Very High"])
+    movies_df.insert(
+        3,
+        "ethnicity_diversity",
+        compute_shannon_entropy(df_movie_actors, "wikipedia_movie_id", "ethnicity_label"),
     )
-    rating_box_fig.show()
+    return movies_df.reset_index()
 
-def rq2_display_diversity_radar_charts(file_path):
+
+def build_diversity_dataset(
+    data_path, ethnicity_mapping_path, output_path=None, max_revenue=2_000_000
+):
     """
-    Displays radar charts comparing diversity metrics for high vs low revenue
-    and high vs low average ratings.
+    Builds the RQ2 diversity dataset read by the `rq2_display_*` functions. Movies with missing
+    values or outliers (outside the 1st-99th percentiles) and movies with a revenue of at least
+    `max_revenue` are removed, the diversity metrics are min-max scaled, and only movies whose
+    scaled metrics are all above 0.1 are kept.
 
     Parameters:
-    - file_path (str): Path to the JSON file containing the dataset.
+    - data_path (str): Path to the movie actors dataset.
+    - ethnicity_mapping_path (str): Path to the CSV file mapping Freebase ids to ethnicities.
+    - output_path (str): Path of the JSON file to save the dataset to, if given.
+    - max_revenue (float): Revenue above which movies are removed.
 
     Returns:
-    - None
+    - pd.DataFrame: The diversity dataset.
     """
-    movies_df = pd.read_json(file_path)
+    movies_df = compute_diversity_metrics(load_data(data_path), ethnicity_mapping_path)
+    movies_df = movies_df.dropna()
 
-    # Create revenue groups for radar chart
-    movies_df["revenue_group"] = pd.qcut(
-        movies_df["revenue"], q=2, labels=["Low Revenue", "High Revenue"]
-    )
+    diversity_columns = [
+        "age_diversity",
+        "gender_diversity",
+        "height_diversity",
+        "ethnicity_diversity",
+    ]
+
+    # Remove outliers, with the limits of each column computed after the previous filters
+    for column in diversity_columns + ["average_rating", "revenue"]:
+        lower_limit, upper_limit = np.percentile(movies_df[column], [1, 99])
+        movies_df = movies_df[movies_df[column].between(lower_limit, upper_limit)]
+    movies_df = movies_df[movies_df["revenue"] < max_revenue]
 
-    # Create average rating groups for radar chart
-    movies_df["average_rating_group"] = pd.qcut(
-        movies_df["average_rating"], q=2, labels=["Low Rating", "High Rating"]
+    # Apply Min-Max scaling and keep movies whose diversity metrics are not close to 0
+    diversity = movies_df[diversity_columns]
+    movies_df[diversity_columns] = (diversity - diversity.min()) / (
+        diversity.max() - diversity.min()
     )
+    movies_df = movies_df[(movies_df[diversity_columns] > 0.1).all(axis=1)]
 
-    numeric_columns = ["age_diversity", "gender_diversity", "height_diversity", "ethnicity_diversity"]
-
-    # Radar Chart for Revenue
-    radar_data = movies_df.groupby("revenue_group")[numeric_columns].mean().reset_index()
-    radar_fig = go.Figure()
-    for _, row in radar_data.iterrows():
-        radar_fig.add_trace(
-            go.Scatterpolar(
-                r=row[numeric_columns].values,
-                theta=numeric_columns,
-                fill="toself",
-                name=row["revenue_group"],
-            )
+    if output_path is not None:
+        movies_df.to_json(output_path, orient="records")
+    return movies_df
+
+
+DIVERSITY_FACTORS = [
+    "age_diversity",
+    "gender_diversity",
+    "height_diversity",
+    "ethnicity_diversity",
+]
+DIVERSITY_GROUP_LABELS = ["Low", "Medium", "High", "Very High"]
+
+# Directory of the columnar copies of the RQ2 datasets, outside of the published website data
+RQ2_CACHE_PATH = "data/.cache/rq2/"
+
+
+class RQ2Dataset:
+    """
+    RQ2 diversity dataset shared by the diversity charts.
+
+    The JSON dataset is parsed once into a columnar Arrow copy saved in the cache directory, which
+    is memory-mapped on later loads and rebuilt when the JSON file changes. If the copy cannot be
+    written, the JSON file is read directly. The quantile groupings used by the charts are computed
+    once and cached.
+
+    Parameters:
+    - file_path (str): Path to the JSON file containing the dataset.
+    - columnar_path (str): Path of the columnar copy, in `RQ2_CACHE_PATH` if None.
+    """
+
+    def __init__(self, file_path, columnar_path=None):
+        self.file_path = Path(file_path)
+        self.columnar_path = (
+            Path(columnar_path)
+            if columnar_path is not None
+            else self._get_default_columnar_path()
         )
-    radar_fig.update_layout(
-        polar=dict(radialaxis=dict(visible=True, range=[0, 1])),
-        title="Diversity Radar Chart: High vs Low Revenue",
-        template="plotly_white",
-        title_x=0.5,
-    )
-    radar_fig.show()
-
-    # Radar Chart for Average Rating
-    rating_data = movies_df.groupby("average_rating_group")[numeric_columns].mean().reset_index()
-    rating_radar_fig = go.Figure()
-    for _, row in rating_data.iterrows():
-        rating_radar_fig.add_trace(
-            go.Scatterpolar(
-                r=row[numeric_columns].values,
-                theta=numeric_columns,
-                fill="toself",
-                name=row["average_rating_group"],
-            )
+        self.file_mtime = self.file_path.stat().st_mtime
+        self.movies_df = self._load()
+
+    def _get_default_columnar_path(self):
+        # Named after the resolved JSON path, so that datasets with the same name do not collide
+        path_hash = hashlib.sha256(str(self.file_path.resolve()).encode()).hexdigest()
+        return Path(RQ2_CACHE_PATH) / f"{self.file_path.stem}-{path_hash[:16]}.arrow"
+
+    def _load(self):
+        if (
+            not self.columnar_path.exists()
+            or self.columnar_path.stat().st_mtime < self.file_mtime
+        ):
+            movies_df = pd.read_json(self.file_path)
+            try:
+                self.columnar_path.parent.mkdir(parents=True, exist_ok=True)
+                # Uncompressed, so that memory-mapped loads do not decompress every column
+                feather.write_feather(
+                    movies_df, self.columnar_path, compression="uncompressed"
+                )
+            except OSError:
+                # E.g. read-only checkout, use the parsed JSON without a columnar copy
+                return movies_df
+        return feather.read_table(self.columnar_path, memory_map=True).to_pandas()
+
+    @cached_property
+    def diversity_groups(self):
+        """Quartile group of each movie for each diversity factor."""
+        return pd.DataFrame(
+            {
+                f"{factor}_group": pd.qcut(
+                    self.movies_df[factor], q=4, labels=DIVERSITY_GROUP_LABELS
+                )
+                for factor in DIVERSITY_FACTORS
+            }
         )
-    rating_radar_fig.update_layout(
-        polar=dict(radialaxis=dict(visible=True, range=[0, 1])),
-        title="Diversity Radar Chart: High vs Low Average Rating",
-        template="plotly_white",
-        title_x=0.5,
-    )
-    rating_radar_fig.show()
+
+    @cached_property
+    def performance_groups(self):
+        """Low and high revenue and average rating groups of each movie."""
+        return pd.DataFrame(
+            {
+                "revenue_group": pd.qcut(
+                    self.movies_df["revenue"], q=2, labels=["Low Revenue", "High Revenue"]
+                ),
+                "average_rating_group": pd.qcut(
+                    self.movies_df["average_rating"],
+                    q=2,
+                    labels=["Low Rating", "High Rating"],
+                ),
+            }
+        )
+
+    def display_correlation_heatmap(self):
+        """Displays a correlation heatmap for diversity metrics and revenue/average rating."""
+        correlation_matrix = self.movies_df.drop(columns=["wikipedia_movie_id"]).corr()
+        heatmap_fig = px.imshow(
+            correlation_matrix,
+            text_auto=True,
+            title="Correlation Between Diversity Metrics and Revenue/Average Rating",
+            color_continuous_scale="Viridis",
+        )
+        heatmap_fig.update_layout(
+            template="plotly_white", title_x=0.5, width=700, height=700
+        )
+        heatmap_fig.show()
+
+    def display_diversity_boxplots(self):
+        """Displays boxplots for revenue and average rating grouped by diversity groups."""
+        for column, title, label in [
+            ("revenue", "Revenue by Diversity Groups", "Revenue"),
+            ("average_rating", "Average Rating by Diversity Groups", "Average Rating"),
+        ]:
+            box_fig = px.box(
+                pd.concat([self.movies_df[[column]], self.diversity_groups], axis=1).melt(
+                    id_vars=[column],
+                    value_vars=list(self.diversity_groups.columns),
+                    var_name="Diversity Factor",
+                    value_name="Group",
+                ),
+                x="Group",
+                y=column,
+                color="Diversity Factor",
+                title=title,
+                labels={"Group": "Diversity Group", column: label},
+                color_discrete_sequence=px.colors.qualitative.Set2,
+            )
+            box_fig.update_layout(
+                template="plotly_white",
+                title_x=0.5,
+                xaxis=dict(categoryorder="array", categoryarray=DIVERSITY_GROUP_LABELS),
+            )
+            box_fig.show()
+
+    def display_diversity_radar_charts(self):
+        """
+        Displays radar charts comparing diversity metrics for high vs low revenue and high vs
+        low average ratings.
+        """
+        for group_column, title in [
+            ("revenue_group", "Diversity Radar Chart: High vs Low Revenue"),
+            ("average_rating_group", "Diversity Radar Chart: High vs Low Average Rating"),
+        ]:
+            radar_data = self.movies_df[DIVERSITY_FACTORS].groupby(
+                self.performance_groups[group_column], observed=False
+            ).mean()
+            radar_fig = go.Figure()
+            for group, row in radar_data.iterrows():
+                radar_fig.add_trace(
+                    go.Scatterpolar(
+                        r=row.values,
+                        theta=DIVERSITY_FACTORS,
+                        fill="toself",
+                        name=group,
+                    )
+                )
+            radar_fig.update_layout(
+                polar=dict(radialaxis=dict(visible=True, range=[0, 1])),
+                title=title,
+                template="plotly_white",
+                title_x=0.5,
+            )
+            radar_fig.show()
+
+
+def get_rq2_dataset(dataset):
+    """
+    Returns the RQ2 dataset to display. Callers can hold an `RQ2Dataset` to share it across
+    charts, a JSON file path is loaded from its columnar copy.
+
+    Parameters:
+    - dataset (RQ2Dataset or str): Dataset, or path to the JSON file containing it.
+
+    Returns:
+    - RQ2Dataset: The dataset.
+    """
+    if isinstance(dataset, RQ2Dataset):
+        return dataset
+    return RQ2Dataset(dataset)
+
+
+def rq2_display_correlation_heatmap(file_path):
+    """
+    Displays a correlation heatmap for diversity metrics and revenue/average rating.
+
+    Parameters:
+    - file_path (RQ2Dataset or str): Dataset, or path to the JSON file containing it.
+
+    Returns:
+    - None
+    """
+    get_rq2_dataset(file_path).display_correlation_heatmap()
+
+
+def rq2_display_diversity_boxplots(file_path):
+    """
+    Displays boxplots for revenue and average rating grouped by diversity groups.
+
+    Parameters:
+    - file_path (RQ2Dataset or str): Dataset, or path to the JSON file containing it.
+
+    Returns:
+    - None
+    """
+    get_rq2_dataset(file_path).display_diversity_boxplots()
+
+
+def rq2_display_diversity_radar_charts(file_path):
+    """
+    Displays radar charts comparing diversity metrics for high vs low revenue
+    and high vs low average ratings.
+
+    Parameters:
+    - file_path (RQ2Dataset or str): Dataset, or path to the JSON file containing it.
+
+    Returns:
+    - None
+    """
+    get_rq2_dataset(file_path).display_diversity_radar_charts()
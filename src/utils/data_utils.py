@@ -0,0 +1,159 @@
+import operator
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FILTER_OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def load_data(path, columns=None, filters=None):
+    """
+    Load a preprocessed dataset saved as CSV or Parquet.
+
+    Parquet files are read with column projection and predicate pushdown, so only the requested
+    columns and the row groups matching `filters` are decoded. CSV files are parsed with `usecols`
+    and filtered after reading.
+
+    Parameters:
+    - path (str): Path to the `.csv` or `.parquet` file.
+    - columns (list of str): Columns to load. All columns are loaded if None.
+    - filters (list of tuple): Row filters as (column, operator, value) tuples, e.g.
+      [("vote_count", ">", 100)]. Supported operators are ==, !=, <, <=, >, >=, in and not in.
+
+    Returns:
+    - pd.DataFrame: The loaded dataset.
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns, filters=filters)
+
+    usecols = None
+    if columns is not None:
+        filter_columns = [column for column, _, _ in filters or []]
+        usecols = list(dict.fromkeys(list(columns) + filter_columns))
+    df = pd.read_csv(path, usecols=usecols)
+
+    if filters:
+        mask = pd.Series(True, index=df.index)
+        for column, op, value in filters:
+            if op == "in":
+                mask &= df[column].isin(value)
+            elif op == "not in":
+                mask &= ~df[column].isin(value)
+            else:
+                mask &= FILTER_OPERATORS[op](df[column], value)
+        df = df[mask].reset_index(drop=True)
+
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def encode_genres(genres, separator=", "):
+    """
+    Parse serialized genre lists once into integer bitmasks.
+
+    Each distinct genre string is split only once, and bit `i` of a movie's mask is set when the
+    movie has genre `genre_names[i]`. Genre filters then become bitwise operations instead of
+    substring searches, which would also match "Drama" inside "Docudrama".
+
+    Parameters:
+    - genres (pd.Series): Genre lists serialized as strings, e.g. "Drama, Comedy".
+    - separator (str): Separator between genres.
+
+    Returns:
+    - pd.Series: Genre bitmask of each movie, as uint64.
+    - list of str: Genre names, sorted alphabetically, indexed by bit position.
+    """
+    codes, uniques = pd.factorize(genres.fillna(""))
+
+    genre_lists = pd.Series(uniques, dtype=object).str.split(separator).explode()
+    genre_lists = genre_lists[genre_lists.str.strip() != ""].str.strip()
+    genre_names = sorted(genre_lists.unique())
+    if len(genre_names) > 64:
+        raise ValueError(f"Cannot encode {len(genre_names)} genres in a 64-bit mask")
+
+    # Bitmask of each distinct genre string, mapped back to the movies through their codes
+    bits = np.left_shift(
+        np.uint64(1), pd.Index(genre_names).get_indexer(genre_lists).astype(np.uint64)
+    )
+    unique_masks = (
+        pd.Series(bits, index=genre_lists.index)
+        .groupby(level=0)
+        .agg(np.bitwise_or.reduce)
+        .reindex(range(len(uniques)), fill_value=0)
+        .to_numpy(dtype=np.uint64)
+    )
+    return pd.Series(unique_masks[codes], index=genres.index), genre_names
+
+
+def decode_genre_masks(genre_masks, genre_names):
+    """
+    Expand genre bitmasks into (row, genre code) pairs, one pair per genre of each movie.
+
+    Parameters:
+    - genre_masks (pd.Series): Genre bitmasks from `encode_genres`.
+    - genre_names (list of str): Genre names from `encode_genres`.
+
+    Returns:
+    - np.ndarray: Position of the movie of each pair in `genre_masks`.
+    - np.ndarray: Genre code of each pair, i.e. its position in `genre_names`.
+    """
+    genre_bits = (
+        genre_masks.to_numpy(dtype=np.uint64)[:, None]
+        >> np.arange(len(genre_names), dtype=np.uint64)
+    ) & np.uint64(1)
+    return np.nonzero(genre_bits)
+
+
+def explode_genres(df, genre_masks, genre_names, column="genres"):
+    """
+    Build one row per movie genre directly from genre bitmasks.
+
+    The genre column is a categorical with a fixed vocabulary, so that later groupbys and
+    filters on it compare integer codes instead of strings.
+
+    Parameters:
+    - df (pd.DataFrame): Movies, aligned with `genre_masks`.
+    - genre_masks (pd.Series): Genre bitmasks from `encode_genres`.
+    - genre_names (list of str): Genre names from `encode_genres`.
+    - column (str): Name of the genre column of the exploded frame.
+
+    Returns:
+    - pd.DataFrame: One row per movie genre, keeping the index of `df`.
+    """
+    rows, codes = decode_genre_masks(genre_masks, genre_names)
+    df_genres = df.iloc[rows].copy()
+    df_genres[column] = pd.Categorical.from_codes(codes, categories=genre_names)
+    return df_genres
+
+
+def clean_roi(roi, floor=-0.99, cap=50):
+    """
+    Clean ROI values for analysis in a single vectorized pass.
+
+    Missing and infinite values (e.g. from zero budgets) and values below `floor` are set to NaN,
+    and values above `cap` are capped.
+
+    Parameters:
+    - roi (pd.Series): Return on investment of each movie.
+    - floor (float): Lowest valid ROI, -0.99 by default.
+    - cap (float): ROI cap, 50 (5000%) by default.
+
+    Returns:
+    - pd.Series: Cleaned ROI.
+    """
+    values = roi.to_numpy(dtype=float)
+    return pd.Series(
+        np.where(np.isfinite(values) & (values >= floor), np.minimum(values, cap), np.nan),
+        index=roi.index,
+    )
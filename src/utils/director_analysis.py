@@ -5,9 +5,21 @@ import json
 import statsmodels.api as sm
 import plotly.graph_objects as go
 
+from ..utils.data_utils import load_data
+
 def director_analysis(data_path):
     # Load the dataset
-    df = pd.read_csv(data_path)
+    df = load_data(
+        data_path,
+        columns=[
+            "movie_id",
+            "director_name",
+            "genres_x",
+            "genres_y",
+            "revenue",
+            "average_rating",
+        ],
+    )
 
     # Parse 'genres_x' into lists
     df["genres_list"] = (
@@ -0,0 +1,207 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from ..utils.data_utils import clean_roi, load_data
+
+# Bump when the derived features change, so that stores built by older code are rebuilt
+FEATURE_SCHEMA_VERSION = 2
+FEATURE_METADATA_KEY = b"movie_features"
+
+# Financial and temporal features derived from each movie's revenue, budget and release date
+FINANCIAL_FEATURES = [
+    "profit",
+    "roi",
+    "roi_clean",
+    "profit_scaled",
+    "revenue_to_budget",
+    "log_revenue",
+    "log_profit",
+    "log_revenue_to_budget",
+]
+TEMPORAL_FEATURES = ["release_month", "release_season"]
+MOVIE_FEATURES = FINANCIAL_FEATURES + TEMPORAL_FEATURES
+
+
+def compute_movie_features(df):
+    """
+    Compute every derived financial and temporal feature of the movies. The temporal features
+    are skipped for datasets without a `release_date` column.
+
+    Parameters:
+    - df (pd.DataFrame): Movies with `revenue`, `budget` and optionally `release_date` columns.
+
+    Returns:
+    - pd.DataFrame: The movies with the features of `MOVIE_FEATURES` added, and `release_date`
+      parsed as a datetime.
+    """
+    df = df.copy()
+
+    # Financial metrics
+    df["profit"] = df["revenue"] - df["budget"]
+    df["roi"] = df["profit"] / df["budget"]
+    df["roi_clean"] = clean_roi(df["roi"])
+    df["profit_scaled"] = df["profit"] / 1e6
+    df["revenue_to_budget"] = df["revenue"] / df["budget"]
+
+    # Log-scaled metrics, NaN where the value is below -1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["log_revenue"] = np.log1p(df["revenue"])
+        df["log_profit"] = np.log1p(df["profit"])
+        df["log_revenue_to_budget"] = np.log1p(df["revenue_to_budget"])
+
+    # Temporal data
+    if "release_date" in df.columns:
+        df["release_date"] = pd.to_datetime(df["release_date"])
+        df["release_month"] = df["release_date"].dt.month
+        df["release_season"] = pd.cut(
+            df["release_date"].dt.month,
+            bins=[0, 3, 6, 9, 12],
+            labels=["Winter", "Spring", "Summer", "Fall"],
+        )
+    return df
+
+
+def get_store_path(data_path):
+    """
+    Return the default feature store path of a dataset, next to the dataset.
+
+    Parameters:
+    - data_path (str): Path to the `.csv` or `.parquet` dataset.
+
+    Returns:
+    - Path: Path of the feature store.
+    """
+    data_path = Path(data_path)
+    return data_path.with_name(f"{data_path.stem}.features.arrow")
+
+
+def get_store_metadata(data_path):
+    """
+    Return the metadata identifying a feature store built from the current dataset with the
+    current feature schema.
+
+    Parameters:
+    - data_path (str): Path to the dataset.
+
+    Returns:
+    - dict: Schema version and size and modification time of the dataset.
+    """
+    stat = Path(data_path).stat()
+    return {
+        "schema_version": FEATURE_SCHEMA_VERSION,
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def build_feature_store(data_path, store_path=None):
+    """
+    Compute the movie features of a dataset and persist them as an uncompressed Arrow file,
+    which can be memory-mapped by `load_movie_features`.
+
+    Parameters:
+    - data_path (str): Path to the `.csv` or `.parquet` dataset.
+    - store_path (str): Path of the feature store, next to the dataset if None.
+
+    Returns:
+    - Path: Path of the feature store.
+    """
+    store_path = Path(store_path or get_store_path(data_path))
+    df = compute_movie_features(load_data(data_path))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[FEATURE_METADATA_KEY] = json.dumps(get_store_metadata(data_path)).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to a temporary file moved into place, so that an interrupted write never leaves a
+    # partial store behind
+    store_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=store_path.parent, prefix=f".{store_path.name}.", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, store_path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return store_path
+
+
+def is_store_valid(data_path, store_path):
+    """
+    Check whether a feature store exists, is readable and was built from the current dataset with
+    the current feature schema.
+
+    Parameters:
+    - data_path (str): Path to the dataset.
+    - store_path (str): Path of the feature store.
+
+    Returns:
+    - bool: Whether the feature store can be used.
+    """
+    if not Path(store_path).exists():
+        return False
+    try:
+        with pa.memory_map(str(store_path)) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+        if FEATURE_METADATA_KEY not in metadata:
+            return False
+        return json.loads(metadata[FEATURE_METADATA_KEY]) == get_store_metadata(data_path)
+    except (OSError, ValueError, pa.ArrowInvalid):
+        # Unreadable or corrupt store, e.g. left by an older interrupted write
+        return False
+
+
+def get_store_columns(data_path, store_path=None):
+    """
+    Return the columns available in the feature store of a dataset, building the store if needed.
+
+    Parameters:
+    - data_path (str): Path to the `.csv` or `.parquet` dataset.
+    - store_path (str): Path of the feature store, next to the dataset if None.
+
+    Returns:
+    - list of str: Dataset columns and features of the store.
+    """
+    store_path = Path(store_path or get_store_path(data_path))
+    if not is_store_valid(data_path, store_path):
+        build_feature_store(data_path, store_path)
+
+    with pa.memory_map(str(store_path)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def load_movie_features(data_path, columns=None, store_path=None):
+    """
+    Load a dataset with its derived movie features from the feature store.
+
+    The store is built on first use, and rebuilt when the dataset or the feature schema
+    changes. It is memory-mapped, so only the requested columns are read.
+
+    Parameters:
+    - data_path (str): Path to the `.csv` or `.parquet` dataset.
+    - columns (list of str): Columns to load, either dataset columns or features. All columns
+      are loaded if None.
+    - store_path (str): Path of the feature store, next to the dataset if None.
+
+    Returns:
+    - pd.DataFrame: The requested columns in the requested order, with typed features.
+    """
+    store_path = Path(store_path or get_store_path(data_path))
+    if not is_store_valid(data_path, store_path):
+        build_feature_store(data_path, store_path)
+
+    if columns is not None:
+        columns = list(dict.fromkeys(columns))
+    df = feather.read_table(store_path, columns=columns, memory_map=True).to_pandas()
+    return df if columns is None else df[columns]
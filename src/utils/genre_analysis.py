@@ -8,6 +8,12 @@ import plotly.graph_objects as go
 import plotly.figure_factory as ff
 from plotly.subplots import make_subplots
 
+from ..utils.data_utils import clean_roi, encode_genres, explode_genres
+from ..utils.feature_store import (
+    MOVIE_FEATURES,
+    get_store_columns,
+    load_movie_features,
+)
 from ..utils.visualization_utils import (
     setup_visualization,
     create_genre_colors,
@@ -15,29 +21,24 @@ from ..utils.visualization_utils import (
 )
 
 
-def prepare_data(df_path):
+def prepare_data(df_path, columns=None):
     """Prepare dataset with all necessary metrics."""
-    df = pd.read_csv(df_path)
-
-    # Financial metrics
-    df["profit"] = df["revenue"] - df["budget"]
-    df["roi"] = (df["revenue"] - df["budget"]) / df["budget"]
-    df["profit_scaled"] = df["profit"] / 1e6
-
-    # Temporal data
-    df["release_date"] = pd.to_datetime(df["release_date"])
-    df["release_month"] = df["release_date"].dt.month
-    df["release_season"] = pd.cut(
-        df["release_date"].dt.month,
-        bins=[0, 3, 6, 9, 12],
-        labels=["Winter", "Spring", "Summer", "Fall"],
-    )
-
-    # Genre processing
+    # Financial and temporal metrics are served by the shared feature store. The genres and the
+    # available features are always loaded along with the requested columns
+    if columns is not None:
+        available = set(get_store_columns(df_path))
+        features = [c for c in ["release_date"] + MOVIE_FEATURES if c in available]
+        columns = list(columns) + ["genres"] + features
+    df = load_movie_features(df_path, columns=columns)
+
+    # Genre processing. Bit `i` of the genre bitmask is set for the genre
+    # `df.attrs["genre_names"][i]`
     df["genres"] = df["genres"].fillna("")
+    df["genre_mask"], df.attrs["genre_names"] = encode_genres(df["genres"])
+
+    # One row per movie genre, built from the bitmasks with a categorical genre column
+    df_genres = explode_genres(df, df["genre_mask"], df.attrs["genre_names"])
     df["genres"] = df["genres"].str.split(", ")
-    df_genres = df.explode("genres")
-    df_genres = df_genres[df_genres["genres"] != ""]
 
     return df, df_genres
 
@@ -128,17 +129,46 @@ def plot_genre_performance(df_genres, genre_colors):
     plt.show()
 
 
-def analyze_temporal_trends(df_genres, genre_colors, unique_genres):
+# Yearly statistics of each genre, as (output column, source column, aggregation)
+TREND_STATISTICS = [
+    ("rating_mean", "vote_average", "mean"),
+    ("rating_std", "vote_average", "std"),
+    ("movie_count", "vote_average", "count"),
+    ("vote_count_mean", "vote_count", "mean"),
+    ("profit_mean", "profit_scaled", "mean"),
+    ("profit_std", "profit_scaled", "std"),
+]
+
+
+def compute_genre_trends(df_genres, window=5):
+    """Compute yearly statistics by genre and their moving averages as a tidy table."""
+    # Single groupby over (genre, year) for every statistic
+    yearly_stats = df_genres.groupby(["genres", "release_year"], observed=True).agg(
+        **{name: (column, func) for name, column, func in TREND_STATISTICS}
+    )
+
+    # Moving averages over the release years of each genre
+    moving_stats = (
+        yearly_stats.groupby(level="genres", observed=True)
+        .rolling(window=window, min_periods=1)
+        .mean()
+        .droplevel(0)
+    )
+    return yearly_stats.join(moving_stats.add_suffix("_moving")).reset_index()
+
+
+def analyze_temporal_trends(df_genres, genre_colors, unique_genres, window=5):
     """Analyze and plot temporal trends."""
+    trends = compute_genre_trends(df_genres, window=window)
+    genre_trends = dict(tuple(trends.groupby("genres", observed=True)))
+
     plt.figure(figsize=(12, 6))
     for genre in unique_genres:
-        genre_data = df_genres[df_genres["genres"] == genre]
-        if len(genre_data) > 0:
-            yearly_avg = genre_data.groupby("release_year")["vote_average"].mean()
-            moving_avg = yearly_avg.rolling(window=5, min_periods=1).mean()
+        if genre in genre_trends:
+            moving_avg = genre_trends[genre]
             plt.plot(
-                moving_avg.index,
-                moving_avg.values,
+                moving_avg["release_year"],
+                moving_avg["rating_mean_moving"],
                 label=genre,
                 color=genre_colors[genre],
                 alpha=0.7,
@@ -146,7 +176,8 @@ def analyze_temporal_trends(df_genres, genre_colors, unique_genres):
             )
 
     plt.title(
-        "Average Movie Ratings by Genre Over Time (5-Year Moving Average)", pad=20
+        f"Average Movie Ratings by Genre Over Time ({window}-Year Moving Average)",
+        pad=20,
     )
     plt.xlabel("Release Year")
     plt.ylabel("Average Rating (0-10)")
@@ -155,20 +186,14 @@ def analyze_temporal_trends(df_genres, genre_colors, unique_genres):
     plt.tight_layout()
     plt.show()
 
+    return trends
 
-def analyze_roi(df, df_genres, genre_colors):
-    """Analyze and visualize ROI distributions."""
-
-    def clean_roi(x):
-        if np.isinf(x) or np.isnan(x) or x < -0.99:
-            return np.nan
-        if x > 50:  # Cap at 5000%
-            return 50
-        return x
 
-    # Clean ROI data
-    df["roi_clean"] = df["roi"].apply(clean_roi)
-    df_genres["roi_clean"] = df_genres["roi"].apply(clean_roi)
+def analyze_roi(df, df_genres, genre_colors, roi_floor=-0.99, roi_cap=50):
+    """Analyze and visualize ROI distributions."""
+    # Clean ROI data once per movie, and carry it to the exploded genres by index
+    df["roi_clean"] = clean_roi(df["roi"], floor=roi_floor, cap=roi_cap)
+    df_genres["roi_clean"] = df["roi_clean"].reindex(df_genres.index)
 
     print("\nOverall ROI Statistics (cleaned):")
     print(df["roi_clean"].describe())
@@ -184,7 +209,7 @@ def analyze_roi(df, df_genres, genre_colors):
     )
     plt.yscale("symlog", linthresh=0.1)
     plt.xticks(rotation=45, ha="right")
-    plt.title("Movie ROI Distribution by Genre (capped at 5000%)", pad=20)
+    plt.title(f"Movie ROI Distribution by Genre (capped at {roi_cap:.0%})", pad=20)
     plt.ylabel("Return on Investment (ROI)")
     plt.xlabel("Genre")
     plt.grid(True, alpha=0.3)
@@ -234,35 +259,89 @@ def analyze_budget_categories(df):
     return budget_roi
 
 
-def analyze_success_failure_rates(df_genres, genre_colors, unique_genres):
-    """Analyze success and failure rates by genre."""
-    performance_thresholds = {
-        "Total Loss (>90%)": -0.9,
-        "Severe Loss (>70%)": -0.7,
-        "Significant Loss (>50%)": -0.5,
-        "Moderate Loss (>30%)": -0.3,
-        "Minor Loss (>0%)": 0,
-        "Break Even": 0,
-        "Modest Success (>50%)": 0.5,
-        "Successful (>100%)": 1.0,
-        "Very Successful (>200%)": 2.0,
-        "Blockbuster (>500%)": 5.0,
-    }
+def compute_threshold_rates(values, groups, thresholds):
+    """Compute the share of values below or above each threshold by group in one pass."""
+    # Each value is located once among the sorted thresholds, and the counts below (or above)
+    # every threshold are cumulative sums of the group x threshold histogram. Missing values
+    # count in the denominator but never pass a threshold, like the mean of a comparison.
+    labels, threshold_values, directions = (
+        zip(*thresholds) if thresholds else ((), (), ())
+    )
+    unknown_directions = set(directions) - {"above", "below"}
+    if unknown_directions:
+        raise ValueError(
+            f"Threshold directions must be 'above' or 'below', got {unknown_directions}"
+        )
 
-    # Calculate rates
-    performance_rates = {}
-    for genre in unique_genres:
-        genre_data = df_genres[df_genres["genres"] == genre]["roi_clean"]
-        rates = {}
-        for threshold_name, threshold in performance_thresholds.items():
-            if "Loss" in threshold_name:
-                rate = (genre_data < threshold).mean()
-            else:
-                rate = (genre_data > threshold).mean()
-            rates[threshold_name] = rate
-        performance_rates[genre] = rates
-
-    performance_df = pd.DataFrame(performance_rates).T.round(3) * 100
+    group_codes, group_names = pd.factorize(groups, sort=True)
+    n_groups = len(group_names)
+    group_sizes = np.bincount(group_codes[group_codes >= 0], minlength=n_groups)
+
+    valid = ~np.isnan(values.to_numpy(dtype=float)) & (group_codes >= 0)
+    valid_values = values.to_numpy(dtype=float)[valid]
+    valid_codes = group_codes[valid]
+
+    threshold_values = np.asarray(threshold_values, dtype=float)
+    sorted_thresholds = np.unique(threshold_values)
+    threshold_positions = np.searchsorted(sorted_thresholds, threshold_values)
+    n_thresholds = len(sorted_thresholds)
+
+    def count_histogram(bins):
+        return np.bincount(
+            valid_codes * (n_thresholds + 1) + bins,
+            minlength=n_groups * (n_thresholds + 1),
+        ).reshape(n_groups, n_thresholds + 1)
+
+    # Values below threshold j have at most j thresholds lower than or equal to them
+    counts_below = count_histogram(
+        np.searchsorted(sorted_thresholds, valid_values, side="right")
+    ).cumsum(axis=1)[:, threshold_positions]
+
+    # Values above threshold j have more than j thresholds strictly lower than them
+    histogram_above = count_histogram(
+        np.searchsorted(sorted_thresholds, valid_values, side="left")
+    )
+    counts_above = (
+        histogram_above.sum(axis=1, keepdims=True) - histogram_above.cumsum(axis=1)
+    )[:, threshold_positions]
+
+    below = np.asarray(directions) == "below"
+    counts = np.where(below, counts_below, counts_above)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rates = counts / group_sizes[:, None]
+    return pd.DataFrame(
+        rates, index=pd.Index(group_names, name=groups.name), columns=list(labels)
+    )
+
+
+# ROI thresholds of the success and failure rates, as (label, threshold, direction): loss rates
+# count movies below their threshold, the other rates count movies above it
+PERFORMANCE_THRESHOLDS = [
+    ("Total Loss (>90%)", -0.9, "below"),
+    ("Severe Loss (>70%)", -0.7, "below"),
+    ("Significant Loss (>50%)", -0.5, "below"),
+    ("Moderate Loss (>30%)", -0.3, "below"),
+    ("Minor Loss (>0%)", 0, "below"),
+    ("Break Even", 0, "above"),
+    ("Modest Success (>50%)", 0.5, "above"),
+    ("Successful (>100%)", 1.0, "above"),
+    ("Very Successful (>200%)", 2.0, "above"),
+    ("Blockbuster (>500%)", 5.0, "above"),
+]
+
+
+def analyze_success_failure_rates(
+    df_genres, genre_colors, unique_genres, extra_thresholds=None
+):
+    """Analyze success and failure rates by genre, with optional extra ROI thresholds."""
+    performance_thresholds = PERFORMANCE_THRESHOLDS + list(extra_thresholds or [])
+
+    # Calculate rates: the share of movies below loss thresholds and above success thresholds
+    performance_rates = compute_threshold_rates(
+        df_genres["roi_clean"], df_genres["genres"], performance_thresholds
+    ).reindex(unique_genres)
+
+    performance_df = performance_rates.round(3) * 100
     print("\nPerformance Rates by Genre:")
     print(performance_df)
 
@@ -300,7 +379,7 @@ def analyze_success_failure_rates(df_genres, genre_colors, unique_genres):
 def get_summary_statistics(df_genres):
     """Calculate and return summary statistics by genre."""
     summary_stats = (
-        df_genres.groupby("genres")
+        df_genres.groupby("genres", observed=True)
         .agg(
             {
                 "profit_scaled": ["mean", "median"],
@@ -351,7 +430,7 @@ def create_interactive_genre_distributions(df_genres, genre_colors):
 
     # Calculate summary statistics for profit
     profit_stats = (
-        df_genres.groupby("genres")["profit_scaled"]
+        df_genres.groupby("genres", observed=True)["profit_scaled"]
         .agg(
             [
                 ("mean", "mean"),
@@ -449,7 +528,7 @@ def create_interactive_genre_distributions(df_genres, genre_colors):
 
     # Calculate summary statistics for ratings
     rating_stats = (
-        df_genres.groupby("genres")["vote_average"]
+        df_genres.groupby("genres", observed=True)["vote_average"]
         .agg(
             [
                 ("mean", "mean"),
@@ -591,65 +670,44 @@ def create_interactive_performance_analysis(df_genres, genre_colors):
     fig.write_html("performance_analysis.html", full_html=False, include_plotlyjs="cdn")
 
 
-def create_interactive_temporal_analysis(df_genres, genre_colors, unique_genres):
+def create_interactive_temporal_analysis(
+    df_genres, genre_colors, unique_genres, window=5
+):
     """Create interactive temporal trend analysis."""
     color_map = prepare_color_map(genre_colors)
+    trends = compute_genre_trends(df_genres, window=window)
+    genre_trends = dict(tuple(trends.groupby("genres", observed=True)))
     fig = go.Figure()
 
     for genre in unique_genres:
-        genre_data = df_genres[df_genres["genres"] == genre]
-        if len(genre_data) > 0:
-            # Calculate yearly statistics
-            yearly_stats = (
-                genre_data.groupby("release_year")
-                .agg(
-                    {
-                        "vote_average": ["mean", "std", "count"],
-                        "vote_count": "mean",
-                        "profit_scaled": ["mean", "std"],
-                    }
-                )
-                .round(2)
-            )
-
-            # Rename columns for easier access
-            yearly_stats.columns = [
-                "rating_mean",
-                "rating_std",
-                "movie_count",
-                "vote_count_mean",
-                "profit_mean",
-                "profit_std",
-            ]
-
-            # Calculate moving averages for all metrics
-            moving_stats = yearly_stats.rolling(window=5, min_periods=1).mean()
+        if genre in genre_trends:
+            stats = genre_trends[genre]
 
             # Create hover text with all information
             hover_text = [
                 f"<b>{genre}</b><br>"
-                + f"Year: {year}<br>"
-                + f"Rating: {moving_stats['rating_mean'][year]:.2f} ± {yearly_stats['rating_std'][year]:.2f}<br>"
-                + f"Movies: {yearly_stats['movie_count'][year]:.0f}<br>"
-                + f"Votes per movie: {yearly_stats['vote_count_mean'][year]:.0f}<br>"
-                + f"Profit: ${moving_stats['profit_mean'][year]:.1f}M ± ${yearly_stats['profit_std'][year]:.1f}M"
-                for year in moving_stats.index
+                + f"Year: {row.release_year}<br>"
+                + f"Rating: {row.rating_mean_moving:.2f} ± {row.rating_std:.2f}<br>"
+                + f"Movies: {row.movie_count:.0f}<br>"
+                + f"Votes per movie: {row.vote_count_mean:.0f}<br>"
+                + f"Profit: ${row.profit_mean_moving:.1f}M ± ${row.profit_std:.1f}M"
+                for row in stats.itertuples()
             ]
 
             fig.add_trace(
                 go.Scatter(
-                    x=moving_stats.index,
-                    y=moving_stats["rating_mean"],
+                    x=stats["release_year"],
+                    y=stats["rating_mean_moving"],
                     name=genre,
                     line=dict(color=color_map[genre]),
                     hovertemplate="%{text}<extra></extra>",
                     text=hover_text,
                     customdata=np.stack(
                         (
-                            yearly_stats["movie_count"],
-                            yearly_stats["vote_count_mean"],
-                            moving_stats["profit_mean"],
-                            yearly_stats["rating_std"],
+                            stats["movie_count"],
+                            stats["vote_count_mean"],
+                            stats["profit_mean_moving"],
+                            stats["rating_std"],
                         ),
                         axis=1,
                     ),
@@ -657,7 +715,7 @@ def create_interactive_temporal_analysis(df_genres, genre_colors, unique_genres)
             )
 
     fig.update_layout(
-        title="Genre Rating Trends Over Time (5-Year Moving Average)",
+        title=f"Genre Rating Trends Over Time ({window}-Year Moving Average)",
         xaxis_title="Release Year",
         yaxis_title="Average Rating",
         hovermode="closest",
@@ -679,7 +737,7 @@ def create_interactive_roi_analysis(df_genres, genre_colors):
     # Calculate summary statistics
     roi_stats = (
         df_genres[df_genres["roi_clean"].notna()]
-        .groupby("genres")["roi_clean"]
+        .groupby("genres", observed=True)["roi_clean"]
         .agg(
             [
                 ("mean", "mean"),
@@ -719,7 +777,9 @@ def create_interactive_roi_analysis(df_genres, genre_colors):
                 (
                     roi_stats["mean"],
                     roi_stats["std"],
-                    df_genres[df_genres["roi_clean"].notna()].groupby("genres").size(),
+                    df_genres[df_genres["roi_clean"].notna()]
+                    .groupby("genres", observed=True)
+                    .size(),
                 ),
                 axis=1,
             ),
@@ -1097,7 +1157,7 @@ def create_interactive_summary_statistics(df_genres):
     """Create interactive summary statistics visualization."""
     # Calculate summary statistics
     summary_stats = (
-        df_genres.groupby("genres")
+        df_genres.groupby("genres", observed=True)
         .agg(
             {
                 "profit_scaled": ["mean", "std"],
@@ -7,10 +7,25 @@ from plotly.subplots import make_subplots
 import statsmodels.api as sm
 import os
 
+from ..utils.feature_store import load_movie_features
+
 def metric_analysis(data_path):
     # 1. Initialize
     # Load the dataset
-    df = pd.read_csv(data_path)
+    df = load_movie_features(
+        data_path,
+        columns=[
+            "vote_average",
+            "vote_count",
+            "revenue",
+            "budget",
+            "profit",
+            "revenue_to_budget",
+            "log_revenue",
+            "log_profit",
+            "log_revenue_to_budget",
+        ],
+    )
 
     # 2. Process the dataset
     # Check 0 vote_average, revenue, and budget
@@ -25,15 +40,7 @@ def metric_analysis(data_path):
     df = df[(df[["vote_average", "revenue", "budget"]] != 0).all(axis=1)]
     df.reset_index(drop=True, inplace=True)
 
-    # Calculate profit
-    df["profit"] = df["revenue"] - df["budget"]
-    # Calculate the ratio of revenue to budget
-    df["revenue_to_budget"] = df["revenue"] / df["budget"]
-
-    # Logscale the revenue and profit columns
-    df["log_revenue"] = np.log1p(df["revenue"])
-    df["log_profit"] = np.log1p(df["profit"])
-    df["log_revenue_to_budget"] = np.log1p(df["revenue_to_budget"])
+    # Profit, the ratio of revenue to budget and their log-scaled values come from the feature store
 
     # 3. Analyze
 
@@ -6,7 +6,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 import plotly.figure_factory as ff
 from plotly.subplots import make_subplots
+from pathlib import Path
 
+from ..utils.data_utils import clean_roi
+from ..utils.feature_store import load_movie_features
 from ..utils.visualization_utils import (
     create_genre_colors,
     hex_to_rgb,
@@ -296,8 +299,23 @@ def analyze_temporal_trends(df):
     return yearly_performance
 
 
+def add_roi_clean(df, roi_floor=-0.99, roi_cap=50):
+    """Add the cleaned ROI column used by the timing analyses, unless it already exists."""
+    if "roi_clean" not in df.columns:
+        df["roi_clean"] = clean_roi(df["roi"], floor=roi_floor, cap=roi_cap)
+    return df
+
+
+def load_timing_data(df):
+    """Load the movie features from the feature store when given a dataset path."""
+    if isinstance(df, (str, Path)):
+        df = load_movie_features(df)
+    return add_roi_clean(df)
+
+
 def run_timing_analysis(df):
     """Run complete timing analysis pipeline."""
+    df = load_timing_data(df)
     results = {}
 
     # Seasonal analysis
@@ -1301,6 +1319,7 @@ def run_seasonal_success_analysis(df):
 
 def run_interactive_timing_analysis(df):
     """Run complete interactive timing analysis pipeline."""
+    df = load_timing_data(df)
 
     results = {}
 
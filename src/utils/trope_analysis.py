@@ -1,6 +1,8 @@
-from collections import defaultdict
 from pathlib import Path
+import hashlib
 import math
+import time
+import warnings
 
 import numpy as np
 import pandas as pd
@@ -12,13 +14,15 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, TruncatedSVD
 from sklearn.manifold import TSNE
 from sklearn.preprocessing import normalize
 
 import networkx as nx
+from scipy import sparse
 
+from src.utils.data_utils import decode_genre_masks, encode_genres
 from src.utils.plot_settings import (
     COLORS,
     COMMON_LAYOUT,
@@ -30,10 +34,71 @@ from src.utils.plot_settings import (
 )
 
 OUTPUT_PATH = "docs/_includes/plotly/"
+EMBEDDING_CACHE_PATH = "data/.cache/embeddings/"
 
 
 def get_unique_genres(df_tropes_filtered):
-    return ['All', 'Action', 'Adventure', 'Comedy', 'Drama', 'Horror', 'Romance', 'Science Fiction']
+    # "All" followed by every genre found in the data
+    _, genre_names = encode_genres(df_tropes_filtered["genres"])
+    return ["All"] + genre_names
+
+
+def select_frequent_tropes(df_cmu_tropes, min_count, max_vote_average=None):
+    # Rows of the tropes appearing in at least `min_count` rows, optionally counting only the rows
+    # with a rating of at most `max_vote_average`. A single value_counts pass replaces a per-trope
+    # groupby filter, and the returned rows are a new frame that callers can modify
+    df_selected = df_cmu_tropes
+    if max_vote_average is not None:
+        df_selected = df_selected[df_selected["vote_average"] <= max_vote_average]
+
+    trope_counts = df_selected["trope"].map(df_selected["trope"].value_counts())
+    return df_selected[trope_counts >= min_count].copy()
+
+
+def compute_trope_ratios(df_tropes_filtered, threshold=6.0, k=10, min_low_count=5):
+    # Ratio of low-rated to high-rated movies of each trope, for all movies and for each genre,
+    # computed with a single groupby over (genre, trope, is_low_rated). Only tropes in at least
+    # `min_low_count` low-rated movies are kept, and the top `k` tropes of each genre are returned
+    genre_masks, genre_names = encode_genres(df_tropes_filtered["genres"])
+
+    # One row per (movie trope, genre) pair, from the bits set in each genre mask
+    rows, genre_codes = decode_genre_masks(genre_masks, genre_names)
+
+    df_all = pd.DataFrame(
+        {
+            "genre": "All",
+            "trope": df_tropes_filtered["trope"].to_numpy(),
+            "is_low_rated": (df_tropes_filtered["vote_average"] < threshold).to_numpy(),
+        }
+    )
+    df_by_genre = pd.DataFrame(
+        {
+            "genre": np.asarray(genre_names, dtype=object)[genre_codes],
+            "trope": df_all["trope"].to_numpy()[rows],
+            "is_low_rated": df_all["is_low_rated"].to_numpy()[rows],
+        }
+    )
+
+    df_trope_ratios = (
+        pd.concat([df_all, df_by_genre], ignore_index=True)
+        .groupby(["genre", "trope", "is_low_rated"])
+        .size()
+        .unstack("is_low_rated", fill_value=0)
+        .reindex(columns=[True, False], fill_value=0)
+    )
+    df_trope_ratios.columns = ["low_count", "high_count"]
+    df_trope_ratios = df_trope_ratios[df_trope_ratios["low_count"] >= min_low_count]
+    df_trope_ratios["ratio"] = df_trope_ratios["low_count"] / (
+        df_trope_ratios["high_count"] + 1
+    )
+
+    return (
+        df_trope_ratios.reset_index()
+        .sort_values(["ratio", "low_count"], ascending=False, kind="stable")
+        .groupby("genre", sort=False)
+        .head(k)
+        .reset_index(drop=True)
+    )
 
 
 def rq6(df_cmu_tropes, threshold=6.0, k=10, min_votes=100):
@@ -46,6 +111,7 @@ def rq6(df_cmu_tropes, threshold=6.0, k=10, min_votes=100):
     ]
     df_tropes_filtered = df_tropes_filtered.sort_values(by="vote_average")
     df_tropes_filtered.reset_index(drop=True, inplace=True)
+
     print(f"Number of unique tropes: {df_tropes_filtered['trope'].nunique()}")
     print(f"Number of unique movies: {df_tropes_filtered['imdb_id'].nunique()}")
     print(f"Shape of the filtered dataset: {df_tropes_filtered.shape}")
@@ -55,13 +121,7 @@ def rq6(df_cmu_tropes, threshold=6.0, k=10, min_votes=100):
 
     # Get the unique genres and the top k tropes with the highest ratio of low-rated movies
     unique_genres = get_unique_genres(df_tropes_filtered)
-
-    df_low_rated_tropes = df_tropes_filtered[
-        df_tropes_filtered["vote_average"] < threshold
-    ]
-    df_high_rated_tropes = df_tropes_filtered[
-        df_tropes_filtered["vote_average"] >= threshold
-    ]
+    df_trope_ratios = compute_trope_ratios(df_tropes_filtered, threshold=threshold, k=k)
 
     # Define the figure and the updatemenus
     fig = go.Figure()
@@ -81,40 +141,12 @@ def rq6(df_cmu_tropes, threshold=6.0, k=10, min_votes=100):
 
     # Iterate over the unique genres and get the top k tropes with the highest ratio of low-rated movies
     for index, genre in enumerate(unique_genres):
-        if genre == "All":
-            plot_title = f"Top {k} tropes for all genres"
-            df_lr_genre_tropes = df_low_rated_tropes
-            df_hr_genre_tropes = df_high_rated_tropes
-        else:
-            plot_title = f"Top {k} tropes for genre {genre}"
-            df_lr_genre_tropes = df_low_rated_tropes[
-                df_low_rated_tropes["genres"].str.contains(genre)
-            ]
-            df_hr_genre_tropes = df_high_rated_tropes[
-                df_high_rated_tropes["genres"].str.contains(genre)
-            ]
-
-        low_rated_tropes = df_lr_genre_tropes.trope.value_counts().to_dict()
-        high_rated_tropes = df_hr_genre_tropes.trope.value_counts().to_dict()
-
-        trope_ratios = {}
-        for trope in low_rated_tropes:
-            low_count = low_rated_tropes[trope]
-            high_count = high_rated_tropes.get(trope, 0)
-
-            if low_count >= 5:
-                ratio = low_count / (high_count + 1)
-                trope_ratios[trope] = ratio
-
-        if len(trope_ratios) < k:
+        df = df_trope_ratios[df_trope_ratios["genre"] == genre]
+        if len(df) < k:
             continue
 
-        sorted_tropes = sorted(trope_ratios.items(), key=lambda x: x[1], reverse=True)[
-            :k
-        ]
-        df = pd.DataFrame(sorted_tropes, columns=["trope", "ratio"])
         print(
-            f"Genre {genre} has {len(sorted_tropes)} tropes with a ratio of low-rated movies to high-rated movies"
+            f"Genre {genre} has {len(df)} tropes with a ratio of low-rated movies to high-rated movies"
         )
 
         fig.add_trace(
@@ -210,12 +242,12 @@ def rq6(df_cmu_tropes, threshold=6.0, k=10, min_votes=100):
     fig.show()
     fig.write_html(f'{OUTPUT_PATH}rq6_tropes.html', full_html=False, include_plotlyjs='cdn')
 
+    return df_trope_ratios
+
 
-def rq7(df_cmu_tropes, show_plotly_charts=True):
+def rq7(df_cmu_tropes, show_plotly_charts=True, return_filtered=False):
     # Filter all tropes that appear in less than 15 movies
-    df_cmu_tropes_filtered = df_cmu_tropes.groupby("trope").filter(
-        lambda x: len(x) >= 15
-    )
+    df_cmu_tropes_filtered = select_frequent_tropes(df_cmu_tropes, min_count=15)
 
     # Get the top 10 tropes with the lowest average rating
     worst_tropes = (
@@ -275,36 +307,203 @@ def rq7(df_cmu_tropes, show_plotly_charts=True):
         plt.title("Top 10 tropes with lowest average rating")
         plt.show()
 
+    if return_filtered:
+        return df_cmu_tropes_filtered
 
-def cluster_movies(df_cmu_tropes, df_tropes, n_clusters, n_tropes):
-    trope_to_idx = {trope_id: idx for idx, trope_id in enumerate(df_tropes["TropeID"])}
-    idx_to_trope = {idx: trope_id for idx, trope_id in enumerate(df_tropes["TropeID"])}
 
-    movie_embeddings = {}
+def build_trope_matrix(
+    df_cmu_tropes, trope_ids=None, n_tropes=None, trope_column="trope_id"
+):
+    # Binary movie x trope incidence matrix in CSR format. Rows follow the order in which movies
+    # first appear in `df_cmu_tropes`, and columns follow `trope_ids` when given. Tropes are
+    # identified by `trope_column`, e.g. "trope" to index the columns by trope name
+    movie_rows, movie_ids = pd.factorize(df_cmu_tropes["id"])
 
-    for i, row in df_cmu_tropes.iterrows():
-        if row['id'] not in movie_embeddings:
-            movie_embeddings[row['id']] = np.zeros(n_tropes)
-        
-        trope_id = row['trope_id']
-        movie_embeddings[row['id']][trope_to_idx[trope_id]] = 1
+    if trope_ids is None:
+        trope_cols, trope_ids = pd.factorize(df_cmu_tropes[trope_column])
+    else:
+        trope_ids = pd.Index(trope_ids)
+        trope_cols = trope_ids.get_indexer(df_cmu_tropes[trope_column])
+        if (trope_cols == -1).any():
+            unknown = df_cmu_tropes[trope_column][trope_cols == -1].unique()
+            raise ValueError(f"Unknown trope ids: {unknown[:10].tolist()}")
+
+    if n_tropes is None:
+        n_tropes = len(trope_ids)
+
+    X = sparse.csr_matrix(
+        (np.ones(len(movie_rows), dtype=np.float64), (movie_rows, trope_cols)),
+        shape=(len(movie_ids), n_tropes),
+    )
+
+    # A movie listing the same trope twice still has a single incidence
+    X.sum_duplicates()
+    X.data[:] = 1
+
+    return X, pd.Index(movie_ids), pd.Index(trope_ids)
+
+
+def iter_row_blocks(X, block_size):
+    # Consecutive row blocks of a matrix, so that it can be streamed through an estimator
+    for start in range(0, X.shape[0], block_size):
+        yield X[start : start + block_size]
 
-    X = np.array(list(movie_embeddings.values()))
+
+def fit_minibatch_kmeans(
+    X, n_clusters, block_size=4096, max_epochs=20, tol=1e-4, random_state=42
+):
+    # Fit MiniBatchKMeans by streaming row blocks through `partial_fit`, one pass per epoch, until
+    # the relative decrease of the inertia falls below `tol`
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_clusters, batch_size=block_size, random_state=random_state, n_init=3
+    )
+    rng = np.random.default_rng(random_state)
+
+    inertia_history = []
+    converged = False
+    start_time = time.perf_counter()
+    for epoch in range(max_epochs):
+        # Shuffle the rows at each epoch so that each block is a representative sample
+        order = rng.permutation(X.shape[0])
+        for block in iter_row_blocks(X[order], block_size):
+            kmeans.partial_fit(block)
+
+        inertia = -sum(kmeans.score(block) for block in iter_row_blocks(X, block_size))
+        inertia_history.append(inertia)
+        if len(inertia_history) > 1 and (
+            inertia_history[-2] - inertia <= tol * inertia_history[-2]
+        ):
+            converged = True
+            break
+
+    kmeans.labels_ = np.concatenate(
+        [kmeans.predict(block) for block in iter_row_blocks(X, block_size)]
+    )
+    kmeans.inertia_ = inertia_history[-1]
+
+    stats = {
+        "n_epochs": len(inertia_history),
+        "converged": converged,
+        "inertia_history": inertia_history,
+        "fit_seconds": time.perf_counter() - start_time,
+    }
+    return kmeans, stats
+
+
+def cluster_movies(
+    df_cmu_tropes,
+    df_tropes,
+    n_clusters,
+    n_tropes,
+    engine="kmeans",
+    block_size=4096,
+    max_epochs=20,
+    return_stats=False,
+):
+    # `engine` is either "kmeans" for full-batch KMeans, or "minibatch" for MiniBatchKMeans fitted
+    # on streamed row blocks, which can later be updated with new movies through `update_clusters`
+    X, movie_ids, _ = build_trope_matrix(
+        df_cmu_tropes, trope_ids=df_tropes["TropeID"], n_tropes=n_tropes
+    )
+    movie_index = {movie_id: row for row, movie_id in enumerate(movie_ids)}
+
+    # Normalization and KMeans both accept the sparse matrix, so it is never densified
     X_normalized = normalize(X)
 
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    kmeans.fit(X_normalized)
+    if engine == "kmeans":
+        start_time = time.perf_counter()
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+        kmeans.fit(X_normalized)
+        stats = {
+            "n_epochs": kmeans.n_iter_,
+            "converged": kmeans.n_iter_ < kmeans.max_iter,
+            "inertia_history": [kmeans.inertia_],
+            "fit_seconds": time.perf_counter() - start_time,
+        }
+    elif engine == "minibatch":
+        kmeans, stats = fit_minibatch_kmeans(
+            X_normalized, n_clusters, block_size=block_size, max_epochs=max_epochs
+        )
+    else:
+        raise ValueError(f"Unknown clustering engine: {engine}")
 
     print("Cluster labels shape:", kmeans.labels_.shape)
     print("Number of samples in each cluster:", np.bincount(kmeans.labels_))
     print("Cluster centers shape:", kmeans.cluster_centers_.shape)
+    print(
+        f"Fitted in {stats['fit_seconds']:.2f}s over {stats['n_epochs']} iterations, "
+        f"converged: {stats['converged']}, inertia: {kmeans.inertia_:.2f}"
+    )
+
+    if return_stats:
+        return X_normalized, kmeans, movie_index, stats
+    return X_normalized, kmeans, movie_index
+
+
+def update_clusters(kmeans, df_new_tropes, df_tropes, n_tropes, block_size=4096):
+    # Update a MiniBatchKMeans model from `cluster_movies(engine="minibatch")` with the tropes of
+    # new movies, and return their cluster labels with their id -> row mapping
+    X, movie_ids, _ = build_trope_matrix(
+        df_new_tropes, trope_ids=df_tropes["TropeID"], n_tropes=n_tropes
+    )
+    X_normalized = normalize(X)
 
-    return X_normalized, kmeans, movie_embeddings
+    for block in iter_row_blocks(X_normalized, block_size):
+        kmeans.partial_fit(block)
 
+    labels = kmeans.predict(X_normalized)
+    movie_index = {movie_id: row for row, movie_id in enumerate(movie_ids)}
+    return labels, movie_index
 
-def plot_movie_clusters(X_normalized, kmeans):
-    tsne = TSNE(n_components=2, random_state=42, perplexity=30, n_iter=1000)
-    X_2d = tsne.fit_transform(X_normalized)
+
+def get_matrix_fingerprint(X):
+    # Hash of the shape and values of a dense or sparse matrix
+    sha256 = hashlib.sha256(str(X.shape).encode())
+    if sparse.issparse(X):
+        X = X.tocsr()
+        for array in (X.indptr, X.indices, X.data):
+            sha256.update(np.ascontiguousarray(array).tobytes())
+    else:
+        sha256.update(np.ascontiguousarray(X).tobytes())
+    return sha256.hexdigest()
+
+
+def compute_embedding(
+    X_normalized,
+    n_svd_components=50,
+    perplexity=30,
+    random_state=42,
+    cache_path=EMBEDDING_CACHE_PATH,
+):
+    # 2-D t-SNE embedding of the movies. The matrix is first reduced with TruncatedSVD, which works
+    # on sparse input, and the coordinates are cached on disk by matrix fingerprint and parameters,
+    # so that every plot of the same matrix reuses a single t-SNE run
+    key = get_matrix_fingerprint(X_normalized)[:16]
+    cache_file = (
+        Path(cache_path)
+        / f"tsne-{key}-{n_svd_components}-{perplexity}-{random_state}.npy"
+    )
+    if cache_file.exists():
+        return np.load(cache_file)
+
+    n_components = min(n_svd_components, X_normalized.shape[1] - 1)
+    X_reduced = TruncatedSVD(
+        n_components=n_components, random_state=random_state
+    ).fit_transform(X_normalized)
+
+    tsne = TSNE(
+        n_components=2, random_state=random_state, perplexity=perplexity, max_iter=1000
+    )
+    X_2d = tsne.fit_transform(X_reduced)
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    np.save(cache_file, X_2d)
+    return X_2d
+
+
+def plot_movie_clusters(X_normalized, kmeans, X_2d=None):
+    if X_2d is None:
+        X_2d = compute_embedding(X_normalized)
 
     tab10_colors = cm.tab10.colors
 
@@ -348,9 +547,10 @@ def plot_movie_clusters(X_normalized, kmeans):
         full_html=False,
     )
 
-def plot_worst_clusters(df_cmu_tmdb_filtered, X_normalized, kmeans, top_k):
-    tsne = TSNE(n_components=2, random_state=42, perplexity=30, n_iter=1000)
-    X_2d = tsne.fit_transform(X_normalized)
+def plot_worst_clusters(df_cmu_tmdb_filtered, X_normalized, kmeans, top_k, X_2d=None):
+    # The worst clusters are sliced from the embedding of all movies
+    if X_2d is None:
+        X_2d = compute_embedding(X_normalized)
 
     cluster_avg_vote_average = df_cmu_tmdb_filtered.groupby("cluster")["vote_average"].mean()
     cluster_avg_vote_average = cluster_avg_vote_average.sort_values(ascending=True)
@@ -404,15 +604,33 @@ def plot_worst_clusters(df_cmu_tmdb_filtered, X_normalized, kmeans, top_k):
     )
 
 
-def compute_worst_clusters_tropes(df_cmu_tmdb_filtered, df_cmu_tropes):
+def compute_worst_clusters_tropes(
+    df_cmu_tmdb_filtered, df_cmu_tropes, n_clusters=10, top_n=10
+):
+    # Top `top_n` trope counts of the `n_clusters` worst-rated clusters, or of all clusters when
+    # `n_clusters` is None, computed with a single join and a single groupby
     cluster_avg_vote_average = df_cmu_tmdb_filtered.groupby("cluster")["vote_average"].mean()
-    worst_clusters_by_rating = cluster_avg_vote_average.sort_values(ascending=True)[:10]
+    worst_clusters_by_rating = cluster_avg_vote_average.sort_values(ascending=True)
+    if n_clusters is not None:
+        worst_clusters_by_rating = worst_clusters_by_rating[:n_clusters]
+
+    df_movie_clusters = df_cmu_tmdb_filtered.loc[
+        df_cmu_tmdb_filtered["cluster"].isin(worst_clusters_by_rating.index),
+        ["id", "cluster"],
+    ].drop_duplicates()
+    df_cluster_tropes = df_cmu_tropes[["id", "trope"]].merge(df_movie_clusters, on="id")
+
+    trope_counts = (
+        df_cluster_tropes.groupby(["cluster", "trope"])
+        .size()
+        .sort_values(ascending=False, kind="stable")
+        .groupby(level="cluster")
+        .head(top_n)
+    )
 
-    worst_clusters_tropes = {}
-    for cluster in worst_clusters_by_rating.index:
-        df_cmu_tropes_filtered = df_cmu_tropes[df_cmu_tropes["id"].isin(df_cmu_tmdb_filtered[df_cmu_tmdb_filtered["cluster"] == cluster]["id"])]
-        counts = df_cmu_tropes_filtered["trope"].value_counts().head(10)
-        worst_clusters_tropes[cluster] = counts.to_dict()
+    worst_clusters_tropes = {cluster: {} for cluster in worst_clusters_by_rating.index}
+    for (cluster, trope), count in trope_counts.items():
+        worst_clusters_tropes[cluster][trope] = count
 
     return worst_clusters_tropes
 
@@ -482,37 +700,130 @@ def plot_trope_combinations(worst_clusters_tropes):
         full_html=False,
     )
 
-def plot_trope_network(worst_clusters_tropes):
-    cooccurrence = defaultdict(lambda: defaultdict(int))
-    trope_frequencies = defaultdict(int)
-
-    for cluster in worst_clusters_tropes.values():
-        tropes = list(cluster.keys())
-        for i in range(len(tropes)):
-            trope1 = tropes[i]
-            trope_frequencies[trope1] += cluster[trope1]
-            for j in range(i + 1, len(tropes)):
-                trope2 = tropes[j]
-                weight = min(cluster[trope1], cluster[trope2])
-                cooccurrence[trope1][trope2] += weight
-                cooccurrence[trope2][trope1] += weight
-
-    filtered_tropes = {trope: freq for trope, freq in trope_frequencies.items() if freq >= 25}
+def compute_trope_cooccurrence(df_cmu_tropes, tropes=None, min_cooccurrence=1):
+    # Exact pairwise co-occurrence of all tropes, or of the `tropes` subset, from the sparse
+    # product X^T X of the movie x trope incidence matrix. Returns the number of movies of each
+    # trope (support) and one row per co-occurring pair with its count, lift and PMI
+    n_movies = df_cmu_tropes["id"].nunique()
+    df_pairs = df_cmu_tropes[["id", "trope"]].drop_duplicates()
+    if tropes is not None:
+        tropes = pd.Index(tropes).unique()
+        df_pairs = df_pairs[df_pairs["trope"].isin(tropes)]
+
+    X, _, trope_names = build_trope_matrix(df_pairs, trope_ids=tropes, trope_column="trope")
+    cooccurrence = (X.T @ X).tocoo()
+    support = pd.Series(
+        np.asarray(X.sum(axis=0)).ravel(), index=trope_names, name="support"
+    )
 
-    G = nx.Graph()
+    # Keep each pair once, without the diagonal that holds the support of each trope
+    mask = (cooccurrence.row < cooccurrence.col) & (cooccurrence.data >= min_cooccurrence)
+    rows, cols = cooccurrence.row[mask], cooccurrence.col[mask]
+    counts = cooccurrence.data[mask]
 
-    for trope, freq in filtered_tropes.items():
-        G.add_node(trope, size=freq)
+    lift = counts * n_movies / (support.values[rows] * support.values[cols])
+    df_cooccurrence = pd.DataFrame(
+        {
+            "trope_1": trope_names[rows],
+            "trope_2": trope_names[cols],
+            "cooccurrence": counts.astype(int),
+            "lift": lift,
+            "pmi": np.log2(lift),
+        }
+    ).sort_values("cooccurrence", ascending=False, ignore_index=True)
+
+    return support, df_cooccurrence
+
+
+def build_trope_network(
+    support, df_cooccurrence, min_support=25, min_cooccurrence=5, min_lift=1.0, max_edges=200
+):
+    # Pruned co-occurrence graph: tropes in at least `min_support` movies, linked by their
+    # `max_edges` strongest pairs that co-occur at least `min_cooccurrence` times with at least
+    # `min_lift`. Tropes left without edges are dropped
+    frequent_tropes = support.index[support >= min_support]
+    df_edges = df_cooccurrence[
+        df_cooccurrence["trope_1"].isin(frequent_tropes)
+        & df_cooccurrence["trope_2"].isin(frequent_tropes)
+        & (df_cooccurrence["cooccurrence"] >= min_cooccurrence)
+        & (df_cooccurrence["lift"] >= min_lift)
+    ].nlargest(max_edges, "cooccurrence")
+
+    G = nx.from_pandas_edgelist(
+        df_edges.assign(weight=df_edges["cooccurrence"]),
+        source="trope_1",
+        target="trope_2",
+        edge_attr=["weight", "cooccurrence", "lift", "pmi"],
+    )
+    nx.set_node_attributes(G, {trope: int(support[trope]) for trope in G.nodes}, "size")
+    return G
+
+
+def build_cluster_trope_network(worst_clusters_tropes, min_support=25):
+    # Graph of the original `plot_trope_network(worst_clusters_tropes)` form: tropes whose counts
+    # over the clusters sum to at least `min_support`, linked with the sum over the clusters of
+    # the smaller count of each pair of top tropes. Tropes left without edges are dropped
+    df_counts = pd.DataFrame(
+        [
+            (cluster, trope, count)
+            for cluster, trope_counts in worst_clusters_tropes.items()
+            for trope, count in trope_counts.items()
+        ],
+        columns=["cluster", "trope", "count"],
+    )
+    support = df_counts.groupby("trope")["count"].sum()
+    frequent_tropes = support.index[support >= min_support]
+    df_counts = df_counts[df_counts["trope"].isin(frequent_tropes)]
+
+    df_pairs = df_counts.merge(df_counts, on="cluster", suffixes=("_1", "_2"))
+    df_pairs = df_pairs[df_pairs["trope_1"] < df_pairs["trope_2"]]
+    df_edges = (
+        df_pairs.assign(weight=np.minimum(df_pairs["count_1"], df_pairs["count_2"]))
+        .groupby(["trope_1", "trope_2"], as_index=False)["weight"]
+        .sum()
+    )
+    df_edges = df_edges[df_edges["weight"] > 0]
 
-    for trope1, connections in cooccurrence.items():
-        if trope1 in filtered_tropes:
-            for trope2, weight in connections.items():
-                if trope2 in filtered_tropes:
-                    if weight > 0:
-                        G.add_edge(trope1, trope2, weight=weight)
+    G = nx.from_pandas_edgelist(
+        df_edges, source="trope_1", target="trope_2", edge_attr="weight"
+    )
+    nx.set_node_attributes(G, {trope: int(support[trope]) for trope in G.nodes}, "size")
+    return G
+
+
+def plot_trope_network(
+    df_cmu_tropes,
+    tropes=None,
+    min_support=25,
+    min_cooccurrence=5,
+    min_lift=1.0,
+    max_edges=200,
+):
+    # Co-occurrence network of the whole corpus, or of a selection of tropes, e.g. the top tropes
+    # of the worst clusters from `compute_worst_clusters_tropes`
+    if isinstance(df_cmu_tropes, dict):
+        # Original call form with the output of `compute_worst_clusters_tropes`
+        warnings.warn(
+            "plot_trope_network(worst_clusters_tropes) is deprecated, pass the tropes dataset "
+            "and optionally `tropes` to select the tropes of the network",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        G = build_cluster_trope_network(df_cmu_tropes, min_support=min_support)
+    else:
+        support, df_cooccurrence = compute_trope_cooccurrence(
+            df_cmu_tropes, tropes=tropes, min_cooccurrence=min_cooccurrence
+        )
+        G = build_trope_network(
+            support,
+            df_cooccurrence,
+            min_support=min_support,
+            min_cooccurrence=min_cooccurrence,
+            min_lift=min_lift,
+            max_edges=max_edges,
+        )
+    max_weight = max((G.edges[edge]["weight"] for edge in G.edges), default=1)
 
-    isolated_nodes = list(nx.isolates(G))
-    G.remove_nodes_from(isolated_nodes)
     pos = nx.spring_layout(G, k=3.0, iterations=100)
 
     edge_trace = []
@@ -525,7 +836,7 @@ def plot_trope_network(worst_clusters_tropes):
             go.Scatter(
                 x=[x0, x1, None],
                 y=[y0, y1, None],
-                line=dict(width=0.5 + (weight/15), color='rgba(136, 136, 136, 0.6)'),
+                line=dict(width=0.5 + 5 * weight / max_weight, color='rgba(136, 136, 136, 0.6)'),
                 hoverinfo='none',
                 mode='lines',
                 opacity=0.5
@@ -593,40 +904,55 @@ def plot_trope_network(worst_clusters_tropes):
         full_html=False,
     )
     
-def rq8(df_cmu_tropes, threshold=6.0, min_trope_occurrences=100):
+def compute_year_trope_matrices(df_tropes, rolling_window=None):
+    # Dense year x trope matrices of movie counts and average scores, built with a single groupby
+    # and zero-filled over the full range of years. With `rolling_window`, counts are smoothed
+    # with a centered rolling mean and scores with the matching count-weighted rolling mean
+    grouped = df_tropes.groupby(["release_year", "trope"])["vote_average"]
+    stats = pd.concat({"count": grouped.size(), "sum": grouped.sum()}, axis=1)
+    stats = stats.unstack("trope", fill_value=0)
+
+    years = stats.index.astype(int)
+    stats = stats.reindex(range(years.min(), years.max() + 1), fill_value=0)
+    stats.index.name = "release_year"
+
+    counts, sums = stats["count"], stats["sum"]
+    if rolling_window is not None:
+        window = dict(window=rolling_window, center=True, min_periods=1)
+        avg_scores = (sums.rolling(**window).sum() / counts.rolling(**window).sum()).fillna(0)
+        counts = counts.rolling(**window).mean()
+    else:
+        avg_scores = (sums / counts).fillna(0)
+
+    return counts, avg_scores
+
+
+def rq8(
+    df_cmu_tropes,
+    threshold=6.0,
+    min_trope_occurrences=100,
+    rolling_window=None,
+    return_filtered=False,
+):
     print(f"Initial shape: {df_cmu_tropes.shape}")
 
-    df_low_rated_movies = df_cmu_tropes[df_cmu_tropes["vote_average"] <= threshold]
-    df_low_rated_movies = df_low_rated_movies.groupby("trope").filter(
-        lambda x: len(x) > min_trope_occurrences
+    # Keep low-rated movies with tropes appearing more than `min_trope_occurrences` times among them
+    df_low_rated_movies = select_frequent_tropes(
+        df_cmu_tropes,
+        min_count=min_trope_occurrences + 1,
+        max_vote_average=threshold,
     )
 
     print(f"Number of rows after filtering: {df_low_rated_movies.shape}")
 
-    # Get the full range of years and tropes
-    all_years = range(df_low_rated_movies["release_year"].min(), df_low_rated_movies["release_year"].max() + 1)
-    tropes = sorted(df_low_rated_movies["trope"].unique())
-    
-    # Create complete year-trope combinations and merge with actual data for counts
-    year_trope_combinations = pd.DataFrame([(year, trope) for year in all_years for trope in tropes], columns=["release_year", "trope"])
-    
-    # Process counts with zero-filling
-    trope_counts = df_low_rated_movies.groupby(["release_year", "trope"]).size().reset_index(name="count")
-    trope_counts = pd.merge(year_trope_combinations, trope_counts, 
-                           on=["release_year", "trope"], 
-                           how="left").fillna(0)
-
-    max_count = trope_counts["count"].max()
-    
-    # Process average scores with zero-filling
-    tropes_avg_scores = df_low_rated_movies.groupby(["release_year", "trope"])["vote_average"].mean().reset_index()
-    tropes_avg_scores = pd.merge(
-                                year_trope_combinations,
-                                tropes_avg_scores, 
-                                on=["release_year", "trope"], 
-                                how="left").fillna(0)
+    # Dense year x trope matrices of counts and average scores, zero-filled over the full year range
+    trope_counts, tropes_avg_scores = compute_year_trope_matrices(
+        df_low_rated_movies, rolling_window=rolling_window
+    )
+    tropes = list(trope_counts.columns)
 
-    max_avg_score = tropes_avg_scores["vote_average"].max()
+    max_count = trope_counts.to_numpy().max()
+    max_avg_score = tropes_avg_scores.to_numpy().max()
 
     num_tropes = len(tropes)
     num_rows = (num_tropes + 2) // 3
@@ -641,12 +967,10 @@ def rq8(df_cmu_tropes, threshold=6.0, min_trope_occurrences=100):
         row = idx // 3 + 1
         col = idx % 3 + 1
         
-        trope_data = trope_counts[trope_counts["trope"] == trope].sort_values("release_year")
-        
         fig_counts.add_trace(
             go.Scatter(
-                x=trope_data["release_year"],
-                y=trope_data["count"],
+                x=trope_counts.index,
+                y=trope_counts[trope],
                 name=trope,
                 showlegend=False,
                 mode='lines',
@@ -676,12 +1000,10 @@ def rq8(df_cmu_tropes, threshold=6.0, min_trope_occurrences=100):
         row = idx // 3 + 1
         col = idx % 3 + 1
         
-        trope_data = tropes_avg_scores[tropes_avg_scores["trope"] == trope].sort_values("release_year")
-        
         fig_avg_scores.add_trace(
             go.Scatter(
-                x=trope_data["release_year"],
-                y=trope_data["vote_average"],
+                x=tropes_avg_scores.index,
+                y=tropes_avg_scores[trope],
                 name=trope,
                 showlegend=False,
                 mode='lines',
@@ -736,3 +1058,6 @@ def rq8(df_cmu_tropes, threshold=6.0, min_trope_occurrences=100):
         include_plotlyjs="cdn",
         full_html=False,
     )
+
+    if return_filtered:
+        return df_low_rated_movies